@@ -0,0 +1,140 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+import tempfile
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Куда складывать оригиналы фото (пусто — архив выключен)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+# Сколько фото скачиваем одновременно
+ARCHIVE_CONCURRENCY = int(os.getenv("ARCHIVE_CONCURRENCY", "4"))
+# Как часто (в секундах) проверяем новые фото, если нас не разбудили
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "60"))
+# После стольких неудачных попыток фото больше не скачиваем
+ARCHIVE_MAX_ATTEMPTS = int(os.getenv("ARCHIVE_MAX_ATTEMPTS", "5"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "100"))
+# Длинная сторона превью в пикселях (миниатюры делаются, только если установлен Pillow)
+THUMB_SIZE = int(os.getenv("ARCHIVE_THUMB_SIZE", "320"))
+
+CHUNK_SIZE = 64 * 1024
+
+
+# ab/cd/abcd….jpg — файлы раскладываются по подпапкам, чтобы не было тысяч в одной
+def _content_path(root, sha256):
+    return os.path.join(root, sha256[:2], sha256[2:4], f"{sha256}.jpg")
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Переносит скачанный файл в хранилище по хэшу. Одинаковые фото хранятся один раз.
+def _store(root, tmp_path):
+    sha256 = _sha256(tmp_path)
+    path = _content_path(root, sha256)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return sha256, path
+
+
+def _make_thumb(root, sha256, path):
+    if Image is None:
+        return None
+    thumb_path = _content_path(os.path.join(root, "thumbs"), sha256)
+    if not os.path.exists(thumb_path):
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        with Image.open(path) as image:
+            image.thumbnail((THUMB_SIZE, THUMB_SIZE))
+            image.convert("RGB").save(thumb_path, "JPEG", quality=80)
+    return thumb_path
+
+
+# Фоновая выгрузка фото заявок в локальный архив. Прогресс хранится в
+# application_photos (archived_at, attempts), поэтому после перезапуска
+# выгрузка продолжается с того места, где остановилась.
+class PhotoArchiver:
+    def __init__(self, bot, repo, root=ARCHIVE_DIR, concurrency=ARCHIVE_CONCURRENCY):
+        self.bot = bot
+        self.repo = repo
+        self.root = root
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.archived = 0
+        self.failed = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    # Вызывается после сохранения заявки, чтобы не ждать ARCHIVE_INTERVAL
+    def wake(self):
+        self._wakeup.set()
+
+    async def archive_photo(self, app_id, position, file_id):
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+            os.close(fd)
+            try:
+                await self.bot.download(file_id, destination=tmp_path, chunk_size=CHUNK_SIZE)
+                sha256, path = await loop.run_in_executor(None, _store, self.root, tmp_path)
+            except Exception as e:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(tmp_path)
+                logging.warning(f"Не удалось скачать фото {position} заявки №{app_id}: {e}")
+                await self.repo.mark_photo_failed(app_id, position)
+                self.failed += 1
+                return False
+            try:
+                thumb_path = await loop.run_in_executor(None, _make_thumb, self.root, sha256, path)
+            except Exception as e:
+                logging.warning(f"Не удалось сделать превью {sha256}: {e}")
+                thumb_path = None
+            await self.repo.mark_photo_archived(app_id, position, sha256, path, thumb_path)
+            self.archived += 1
+            return True
+
+    # Одна пачка ожидающих фото; возвращает, сколько удалось сохранить
+    async def archive_pending(self):
+        photos = await self.repo.pending_photos(ARCHIVE_MAX_ATTEMPTS, ARCHIVE_BATCH)
+        results = await asyncio.gather(*[self.archive_photo(*photo) for photo in photos])
+        return sum(results)
+
+    async def _archive_loop(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                archived = await self.archive_pending()
+            except Exception as e:
+                logging.error(f"Ошибка архивации фото: {e}")
+                archived = 0
+            # Пока есть что качать — не ждём; иначе спим до новой заявки
+            if archived:
+                continue
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), ARCHIVE_INTERVAL)
+
+    async def start(self):
+        if not self.root:
+            return
+        if Image is None:
+            logging.warning("Pillow не установлен: фото архивируются без превью (pip install Pillow)")
+        os.makedirs(self.root, exist_ok=True)
+        self._task = asyncio.create_task(self._archive_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
@@ -0,0 +1,216 @@
+# Нагрузочный тест без сети: синтетические апдейты идут прямо в dp.feed_update,
+# а запросы к Telegram API отвечает заглушка.
+#
+#   python bench.py --users 200 --concurrency 50 --album 5
+#
+# Прогоняет полную анкету для каждой категории из PHOTO_PROMPTS (одиночные фото
+# и альбомы), ответы экспертов и печатает p50/p95/p99 времени апдейта,
+# апдейты в секунду, время записи в БД и память на одну активную FSM-сессию.
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+EXPERT_IDS = [900001, 900002]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк бота")
+    parser.add_argument("--users", type=int, default=100, help="сколько пользователей проходят анкету")
+    parser.add_argument("--concurrency", type=int, default=20, help="сколько пользователей одновременно")
+    parser.add_argument("--album", type=int, default=4, help="фото в альбоме (0 — только одиночные фото)")
+    parser.add_argument("--photos", type=int, default=2, help="одиночных фото на заявку")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа API, мс")
+    parser.add_argument("--storage", default="memory", help="FSM_STORAGE для прогона")
+    parser.add_argument("--sessions", type=int, default=1000, help="сессий для замера памяти")
+    return parser.parse_args()
+
+
+def configure(args, workdir):
+    # Лимиты отправки снимаем: меряем бота, а не Telegram
+    os.environ.update(
+        API_TOKEN="1:bench",
+        EXPERT_IDS=",".join(map(str, EXPERT_IDS)),
+        FSM_STORAGE=args.storage,
+        LOG_FILE=os.path.join(workdir, "bot.log"),
+        METRICS_PORT="0",
+        METRICS_LOG_INTERVAL="0",
+        ARCHIVE_DIR="",
+        THROTTLE_RATE="0",
+        ALBUM_LATENCY="0.01",
+        SEND_GLOBAL_RATE="1000000",
+        SEND_CHAT_RATE="1000000",
+        SEND_GROUP_RATE="1000000",
+    )
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Bench:
+    def __init__(self, app, args):
+        self.app = app
+        self.args = args
+        self.latencies = []
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+
+    def message(self, user_id, **fields):
+        from aiogram import types
+        payload = dict(
+            message_id=next(self.message_ids), date=int(time.time()),
+            chat=dict(id=user_id, type="private"),
+            from_user=dict(id=user_id, is_bot=False, first_name="Bench", username=f"user{user_id}"),
+        )
+        payload.update(fields)
+        return types.Update(update_id=next(self.update_ids), message=payload)
+
+    def callback(self, user_id, data):
+        from aiogram import types
+        return types.Update(update_id=next(self.update_ids), callback_query=dict(
+            id=str(next(self.message_ids)), chat_instance="bench", data=data,
+            from_user=dict(id=user_id, is_bot=False, first_name="Expert"),
+        ))
+
+    def photo(self, user_id, **fields):
+        unique = f"{user_id}_{next(self.message_ids)}"
+        return self.message(user_id, photo=[dict(file_id=f"f{unique}", file_unique_id=f"u{unique}", width=800, height=600)], **fields)
+
+    async def feed(self, update):
+        started = time.perf_counter()
+        await self.app.dp.feed_update(self.app.bot, update)
+        self.latencies.append(time.perf_counter() - started)
+
+    async def state_of(self, user_id):
+        from aiogram.fsm.storage.base import StorageKey
+        key = StorageKey(bot_id=self.app.bot.id, chat_id=user_id, user_id=user_id)
+        return await self.app.dp.storage.get_state(key)
+
+    # Полная анкета одного пользователя
+    async def user_flow(self, user_id, category):
+        await self.feed(self.message(user_id, text="/start"))
+        await self.feed(self.message(user_id, text=category))
+        for _ in range(self.args.photos):
+            await self.feed(self.photo(user_id))
+        if self.args.album:
+            group = f"g{user_id}"
+            await asyncio.gather(*[
+                self.feed(self.photo(user_id, media_group_id=group)) for _ in range(self.args.album)
+            ])
+        await self.feed(self.message(user_id, text="Продолжить"))
+        # Отвечаем на вопросы, пока анкета не завершится
+        for step in range(10):
+            if await self.state_of(user_id) is None:
+                break
+            await self.feed(self.message(user_id, text=f"Ответ {step}"))
+
+    async def expert_flow(self, app_number):
+        app = await self.app.repo.get_application(app_number)
+        expert_id = app["expert_id"]
+        await self.feed(self.callback(expert_id, f"reply:{app_number}:"))
+        await self.feed(self.message(expert_id, text="500–700 USD"))
+
+    async def run_flows(self):
+        categories = list(self.app.PHOTO_PROMPTS)
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def limited(coro):
+            async with semaphore:
+                await coro
+
+        await asyncio.gather(*[
+            limited(self.user_flow(100000 + i, categories[i % len(categories)]))
+            for i in range(self.args.users)
+        ])
+        # Заявки отвечаем по одной: эксперт — один чат, его состояние общее
+        for app_number in range(1, self.args.users + 1):
+            await self.expert_flow(app_number)
+
+    # Память на сессию: пользователи, застрявшие на шаге с фото
+    async def session_memory(self):
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for i in range(self.args.sessions):
+            user_id = 500000 + i
+            await self.app.dp.feed_update(self.app.bot, self.message(user_id, text="/start"))
+            await self.app.dp.feed_update(self.app.bot, self.message(user_id, text="Монеты"))
+            await self.app.dp.feed_update(self.app.bot, self.photo(user_id))
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        grown = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+        return grown / max(1, self.args.sessions)
+
+
+def make_session(args):
+    from aiogram import types
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import SendMediaGroup
+
+    # Заглушка API: отвечает правдоподобными объектами без сети
+    class FakeSession(BaseSession):
+        async def make_request(self, bot, method, timeout=None):
+            if args.api_latency:
+                await asyncio.sleep(args.api_latency / 1000)
+            if method.__returning__ is bool:
+                return True
+            chat = types.Chat(id=getattr(method, "chat_id", 0) or 0, type="private")
+            message = types.Message(message_id=1, date=int(time.time()), chat=chat, text="ok")
+            if isinstance(method, SendMediaGroup):
+                return [message] * len(method.media)
+            return message
+
+        async def stream_content(self, *args, **kwargs):
+            yield b""
+
+        async def close(self):
+            pass
+
+    return FakeSession()
+
+
+async def main(args):
+    import bot as app
+    from metrics import db_write_latency
+
+    app.bot.session = make_session(args)
+    bench = Bench(app, args)
+
+    await app.dp.emit_startup(bot=app.bot)
+    started = time.perf_counter()
+    await bench.run_flows()
+    elapsed = time.perf_counter() - started
+    await app.sender.stop()
+
+    memory = await bench.session_memory()
+    await app.dp.emit_shutdown(bot=app.bot)
+
+    latencies = bench.latencies
+    writes = db_write_latency.values.get((), None)
+    n = len(db_write_latency.buckets)
+    print(f"Заявок:             {args.users}")
+    print(f"Апдейтов:           {len(latencies)} за {elapsed:.2f} с ({len(latencies) / elapsed:.0f} апд/с)")
+    print(f"Заявок в секунду:   {args.users / elapsed:.1f}")
+    print(f"Апдейт p50/p95/p99: {percentile(latencies, 0.5) * 1000:.2f} / "
+          f"{percentile(latencies, 0.95) * 1000:.2f} / {percentile(latencies, 0.99) * 1000:.2f} мс")
+    if writes:
+        print(f"Запись в БД:        {writes[n]} коммитов, в среднем {writes[n + 1] / writes[n] * 1000:.2f} мс, "
+              f"максимум {writes[n + 2] * 1000:.2f} мс")
+    print(f"Память на сессию:   {memory:.0f} байт ({args.storage})")
+    print(f"Отправлено в API:   {app.sender.sent}, ошибок {app.sender.failed}")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        configure(args, workdir)
+        asyncio.run(main(args))
@@ -1,160 +1,151 @@
+import contextlib
 import logging
-import sqlite3
 import os
-from datetime import datetime
 import asyncio
 
 from aiogram import Bot, Dispatcher, F, types
-from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import (
-    ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove,
-    BotCommand, InlineKeyboardMarkup, InlineKeyboardButton
-)
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.client.default import DefaultBotProperties
 from aiogram.filters.callback_data import CallbackData
+from aiogram.methods import SendMessage, SendMediaGroup, SendPhoto
 from dotenv import load_dotenv
 
+# .env читается до импорта модулей ниже: они берут настройки из окружения при импорте
 load_dotenv()
 
-API_TOKEN = os.getenv("API_TOKEN")
-EXPERT_ID = int(os.getenv("EXPERT_ID"))
-
-logging.basicConfig(
-    filename='bot.log',
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(message)s'
+from archive import PhotoArchiver
+from cache import TTLCache
+from dashboard import (
+    DASHBOARD_PAGE_SIZE, FIND_HELP, OpenCallback, PageCache, PageCallback, format_page, page_keyboard,
+    parse_query, query_filters, query_title, set_expert_commands
 )
+from db import DB_FILE, ApplicationRepository
+from experts import ExpertPool, check_experts, parse_categories, parse_ids
+from fsm_storage import create_storage
+from logging_setup import setup_logging
+from metrics import REGISTRY, ApiMetricsMiddleware, MetricsServer, duplicates_total
+from middlewares import AlbumMiddleware, FSMBufferMiddleware, LogContextMiddleware, MetricsMiddleware, ThrottleMiddleware
+from questionnaire import (
+    FIRST_STEP, PHOTO_PROMPTS, QUESTION_STATES, TRANSITIONS, Form, build_info, submission_digest
+)
+from sender import Sender
+from ui import (
+    APPLICATION_TEMPLATE, BOT_COMMANDS, CANCEL_KEYBOARD, CATEGORY_KEYBOARD, DUPLICATE_TEXT, EXPERT_ANSWER_TEMPLATE,
+    PHOTO_KEYBOARD, PHOTO_PROMPT_TEXTS, REMINDER_TEMPLATE, REMOVE_KEYBOARD, START_TEXT, THANKS_TEXT,
+    THROTTLE_PHOTO_TEXT, THROTTLE_TEXT
+)
+from webhook import check_secret, run_webhook
+
+API_TOKEN = os.getenv("API_TOKEN")
+# Эксперты: EXPERT_IDS="111,222" (или один EXPERT_ID), категории за ними —
+# EXPERT_CATEGORIES="Монеты=111;Живопись=222,333"
+EXPERT_IDS = parse_ids(os.getenv("EXPERT_IDS") or os.getenv("EXPERT_ID"))
+EXPERT_CATEGORIES = parse_categories(os.getenv("EXPERT_CATEGORIES"))
+check_experts(EXPERT_IDS, EXPERT_CATEGORIES)
+# Где хранить состояние анкет: memory, sqlite:///fsm.db или redis://...
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite:///fsm.db")
+# Режим получения апдейтов: polling (для разработки) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Одинаковая заявка от того же пользователя в течение стольких секунд считается повтором
+DUPLICATE_WINDOW = int(os.getenv("DUPLICATE_WINDOW", "3600"))
+DUPLICATE_CACHE_SIZE = int(os.getenv("DUPLICATE_CACHE_SIZE", "10000"))
+# Номер процесса при запуске через workers.py; фоновые задачи выполняет только нулевой
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "0"))
+
+# JSON-логи через очередь, запись в файл — в отдельном потоке
+setup_logging()
 
 bot = Bot(
     token=API_TOKEN,
     default=DefaultBotProperties(parse_mode="HTML")
 )
-dp = Dispatcher()
-
-DB_FILE = "applications.db"
-
-# Инициализация БД
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS applications (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            username TEXT,
-            full_name TEXT,
-            category TEXT,
-            photos TEXT,
-            info TEXT,
-            timestamp TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-init_db()
-
-# Сохранение заявки
-def save_application(user_id, username, full_name, category, photos, info_dict):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    photos_str = ','.join(photos) if photos else ''
-    info_str = str(info_dict)
-    timestamp = datetime.now().strftime("%d.%m.%Y %H:%M")
-    c.execute('''
-        INSERT INTO applications (user_id, username, full_name, category, photos, info, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (user_id, username or "нет", full_name, category, photos_str, info_str, timestamp))
-    conn.commit()
-    app_id = c.lastrowid
-    conn.close()
-    return app_id
-
-# Состояния пользователя
-class Form(StatesGroup):
-    category = State()
-    photos = State()
-    info = State()
-    technique = State()
-    size = State()
-    material_weight = State()
-    country_year = State()
-    book_info = State()
-    detailed_info = State()
+# Время и ошибки запросов к Telegram API
+bot.session.middleware(ApiMetricsMiddleware())
+# Состояние FSM читает FSMBufferMiddleware — один раз за апдейт, под блокировкой
+dp = Dispatcher(storage=create_storage(FSM_STORAGE), disable_fsm=True)
+# Счётчики апдейтов и время обработки по состояниям
+update_metrics = MetricsMiddleware()
+dp.message.outer_middleware(update_metrics)
+dp.callback_query.outer_middleware(update_metrics)
+# Альбомы приходят в хендлер целиком, а не по одному фото
+dp.message.outer_middleware(AlbumMiddleware())
+# Апдейты пользователя по очереди, одно чтение и одна запись FSM на апдейт
+fsm_buffer = FSMBufferMiddleware(dp.fsm)
+dp.message.outer_middleware(fsm_buffer)
+dp.callback_query.outer_middleware(fsm_buffer)
+# Анти-флуд по пользователям (эксперты не ограничиваются)
+throttle = ThrottleMiddleware(THROTTLE_TEXT, THROTTLE_PHOTO_TEXT, exempt=EXPERT_IDS)
+dp.message.middleware(throttle)
+dp.callback_query.middleware(throttle)
+# user_id, имя хендлера и время работы в каждой записи лога
+dp.message.middleware(LogContextMiddleware())
+dp.callback_query.middleware(LogContextMiddleware())
+
+# Очередь исходящих уведомлений с учётом лимитов Telegram
+sender = Sender(bot)
+REGISTRY.gauge("bot_send_queue_depth", "Сообщений в очереди отправки", lambda: sender.pending)
+REGISTRY.counter("bot_send_sent_total", "Отправлено через очередь", lambda: sender.sent)
+REGISTRY.counter("bot_send_failed_total", "Не отправлено после всех попыток", lambda: sender.failed)
+REGISTRY.counter("bot_send_retries_total", "Повторные попытки отправки", lambda: sender.retries)
+REGISTRY.gauge("bot_send_latency_p95", "95-й перцентиль задержки отправки", lambda: sender.stats()["latency_p95"])
+
+# /metrics и периодическая сводка в лог
+metrics_server = MetricsServer()
+
+# Хранилище заявок (открывается при старте бота)
+repo = ApplicationRepository(DB_FILE)
+
+# Пул экспертов и очередь заявок на оценку
+experts = ExpertPool(repo, EXPERT_IDS, EXPERT_CATEGORIES)
+
+# Фоновая выгрузка фото заявок в локальный архив (ARCHIVE_DIR)
+archiver = PhotoArchiver(bot, repo)
+REGISTRY.counter("bot_archive_photos_total", "Фото, сохранённые в архив", lambda: archiver.archived)
+REGISTRY.counter("bot_archive_failed_total", "Неудачные попытки скачать фото", lambda: archiver.failed)
+
+async def on_startup():
+    await repo.start()
+    if WORKER_INDEX == 0:
+        await experts.start()
+        await archiver.start()
+    await metrics_server.start()
+
+async def on_shutdown():
+    await metrics_server.stop()
+    await experts.stop()
+    await archiver.stop()
+    await sender.stop()
+    await repo.stop()
+
+dp.startup.register(on_startup)
+dp.shutdown.register(on_shutdown)
 
 # Состояния эксперта
 class ExpertForm(StatesGroup):
     summa = State()
 
 # Callback для кнопки ответа
+# (user_id остался для старых кнопок, автор заявки берётся из БД)
 class ReplyCallback(CallbackData, prefix="reply"):
     app_number: int
-    user_id: int
-
-# Промпты для фото
-PHOTO_PROMPTS = {
-    "Автографы": "Сфотографируй общий вид предмета и отдельно крупно сам автограф.",
-    "Боны": "Сфотографируй бону с двух сторон.",
-    "Декоративно-прикладное искусство": "Сфотографируй предмет со всех сторон, снизу, клеймо или подпись (если есть) и все дефекты.",
-    "Живопись": "Сделай общее фото картины, фото обратной стороны и крупно подпись (если она есть).",
-    "Книги": "Сделай общие фото книги, титульный лист, страницы с надписями и дефектами.",
-    "Марки": "Сфотографируй марки крупно с двух сторон. Если они в альбоме — пришли фото страниц.",
-    "Медали": "Сфотографируй медаль с двух сторон.",
-    "Монеты": "Сфотографируй монету с двух сторон и отдельно ребро (если там есть надписи).",
-    "Открытки": "Сфотографируй открытку с двух сторон.",
-    "Фотографии": "Сфотографируй фотографию с двух сторон."
-}
-
-# Клавиатуры
-def category_keyboard():
-    buttons = [
-        ["Автографы", "Боны"],
-        ["Декоративно-прикладное искусство", "Живопись"],
-        ["Книги", "Марки"],
-        ["Медали", "Монеты"],
-        ["Открытки", "Фотографии"]
-    ]
-    kb = [[KeyboardButton(text=text) for text in row] for row in buttons]
-    kb.append([KeyboardButton(text="Отмена")])
-    return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True, one_time_keyboard=True)
-
-def photo_keyboard():
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="Отправить ещё фото"), KeyboardButton(text="Продолжить")],
-            [KeyboardButton(text="Отмена")]
-        ],
-        resize_keyboard=True,
-        one_time_keyboard=False,
-        input_field_placeholder="Пришли фото или нажми кнопку"
-    )
-
-def cancel_keyboard():
-    return ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text="Отмена")]],
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
+    user_id: int | None = None
 
 # Команды меню
 async def set_commands():
-    commands = [
-        BotCommand(command="start", description="Начать новую заявку на оценку"),
-        BotCommand(command="cancel", description="Отменить текущую заявку")
-    ]
-    await bot.set_my_commands(commands)
+    await bot.set_my_commands(BOT_COMMANDS)
+    await set_expert_commands(bot, BOT_COMMANDS, EXPERT_IDS)
 
 # Старт
 @dp.message(Command("start"))
 async def start(message: types.Message, state: FSMContext):
     await state.clear()
     await message.answer(
-        "Привет! 😊 Я помогу тебе отправить один предмет на оценку нашему эксперту по антиквариату.\n\n"
-        "Это займёт всего 2–3 минуты, и ты получишь предварительную оценку бесплатно.\n\n"
-        "Для начала выбери категорию предмета:",
-        reply_markup=category_keyboard()
+        START_TEXT,
+        reply_markup=CATEGORY_KEYBOARD
     )
     await state.set_state(Form.category)
 
@@ -165,7 +156,7 @@ async def cancel(message: types.Message, state: FSMContext):
     await state.clear()
     await message.answer(
         "Заявка отменена. Чтобы начать новую — нажми /start 😊",
-        reply_markup=ReplyKeyboardRemove()
+        reply_markup=REMOVE_KEYBOARD
     )
 
 # Выбор категории
@@ -176,17 +167,11 @@ async def handle_category(message: types.Message, state: FSMContext):
 
     category = message.text.strip()
     if category not in PHOTO_PROMPTS:
-        await message.answer("Выбери категорию из предложенных ниже 👇", reply_markup=category_keyboard())
+        await message.answer("Выбери категорию из предложенных ниже 👇", reply_markup=CATEGORY_KEYBOARD)
         return
 
     await state.update_data(category=category, photos=[])
-    photo_prompt = (
-        "📸 Чтобы эксперт мог дать точную оценку, пришли фото в хорошем качестве "
-        "и при дневном освещении (без вспышки).\n\n" +
-        PHOTO_PROMPTS.get(category, "") +
-        "\n\nПрисылай фото. Когда закончишь — нажми «Продолжить»."
-    )
-    await message.answer(photo_prompt, reply_markup=photo_keyboard())
+    await message.answer(PHOTO_PROMPT_TEXTS[category], reply_markup=PHOTO_KEYBOARD)
     await state.set_state(Form.photos)
 
 # Лимит фото
@@ -197,23 +182,27 @@ MAX_PHOTOS = 15
 async def handle_album(message: types.Message, state: FSMContext, album: list[types.Message]):
     data = await state.get_data()
     photos = data.get("photos", [])
+    photo_uids = data.get("photo_uids", [])
     added = 0
 
     for msg in album:
         if msg.photo and len(photos) < MAX_PHOTOS:
             photos.append(msg.photo[-1].file_id)
+            photo_uids.append(msg.photo[-1].file_unique_id)
             added += 1
 
+    # Одна запись в хранилище и один ответ на весь альбом
     if added > 0:
-        await state.update_data(photos=photos)
-        await message.answer(
-            f"Получен альбом: +{added} фото. Всего: {len(photos)} 📸\n"
-            "Присылай ещё или нажми «Продолжить».",
-            reply_markup=photo_keyboard()
-        )
+        await state.update_data(photos=photos, photo_uids=photo_uids)
+        text = f"Получен альбом: +{added} фото. Всего: {len(photos)} 📸\n"
+    else:
+        text = ""
 
     if len(photos) >= MAX_PHOTOS:
-        await message.answer(f"Достигнут лимит {MAX_PHOTOS} фото. Нажми «Продолжить».")
+        text += f"Достигнут лимит {MAX_PHOTOS} фото. Нажми «Продолжить»."
+    else:
+        text += "Присылай ещё или нажми «Продолжить»."
+    await message.answer(text, reply_markup=PHOTO_KEYBOARD)
 
 # Обработка одиночного фото
 @dp.message(Form.photos, F.photo)
@@ -222,20 +211,22 @@ async def handle_single_photo(message: types.Message, state: FSMContext):
     photos = data.get("photos", [])
 
     if len(photos) >= MAX_PHOTOS:
-        await message.answer(f"Достигнут лимит {MAX_PHOTOS} фото. Нажми «Продолжить».", reply_markup=photo_keyboard())
+        await message.answer(f"Достигнут лимит {MAX_PHOTOS} фото. Нажми «Продолжить».", reply_markup=PHOTO_KEYBOARD)
         return
 
     photos.append(message.photo[-1].file_id)
-    await state.update_data(photos=photos)
+    photo_uids = data.get("photo_uids", [])
+    photo_uids.append(message.photo[-1].file_unique_id)
+    await state.update_data(photos=photos, photo_uids=photo_uids)
     await message.answer(
         f"Получено +1 фото. Всего: {len(photos)} 📸\nПрисылай ещё или нажми «Продолжить».",
-        reply_markup=photo_keyboard()
+        reply_markup=PHOTO_KEYBOARD
     )
 
 # Кнопка "Отправить ещё фото"
 @dp.message(Form.photos, F.text == "Отправить ещё фото")
 async def send_more_photos(message: types.Message):
-    await message.answer("Хорошо, присылай ещё фото.", reply_markup=photo_keyboard())
+    await message.answer("Хорошо, присылай ещё фото.", reply_markup=PHOTO_KEYBOARD)
 
 # Кнопка "Продолжить" после фото
 @dp.message(Form.photos, F.text == "Продолжить")
@@ -244,107 +235,119 @@ async def photos_continue(message: types.Message, state: FSMContext):
     photos = data.get("photos", [])
 
     if len(photos) == 0:
-        await message.answer("Пришли хотя бы одно фото, пожалуйста.", reply_markup=photo_keyboard())
+        await message.answer("Пришли хотя бы одно фото, пожалуйста.", reply_markup=PHOTO_KEYBOARD)
         return
 
-    category = data["category"]
-
-    if category in ["Автографы", "Марки", "Медали", "Открытки", "Фотографии"]:
-        await message.answer("Расскажи всё, что знаешь о предмете (страна, год, автор, состояние и т.д.).", reply_markup=cancel_keyboard())
-        await state.set_state(Form.info)
-
-    elif category == "Боны":
-        await message.answer("Укажи страну и год выпуска, если знаешь.", reply_markup=cancel_keyboard())
-        await state.set_state(Form.country_year)
-
-    elif category == "Живопись":
-        await message.answer("Какая техника исполнения (масло, акварель, гуашь и т.д.)?", reply_markup=cancel_keyboard())
-        await state.set_state(Form.technique)
-
-    elif category == "Монеты":
-        await message.answer("Из какого материала монета и какой вес (если знаешь)?", reply_markup=cancel_keyboard())
-        await state.set_state(Form.material_weight)
-
-    elif category == "Декоративно-прикладное искусство":
-        await message.answer("Какой размер предмета и из какого материала он сделан?", reply_markup=cancel_keyboard())
-        await state.set_state(Form.size)
-
-    elif category == "Книги":
-        await message.answer("Название книги, автор и год издания?", reply_markup=cancel_keyboard())
-        await state.set_state(Form.book_info)
+    # Первый вопрос категории берётся из таблицы переходов
+    next_state, prompt = FIRST_STEP[data["category"]]
+    await message.answer(prompt, reply_markup=CANCEL_KEYBOARD)
+    await state.set_state(next_state)
 
-# Дальнейшие вопросы (оставлены без изменений, кроме переходов)
-@dp.message(Form.info)
-async def handle_info(message: types.Message, state: FSMContext):
+# Вопросы анкеты: один хендлер на все категории, шаги — в questionnaire.CATEGORIES
+@dp.message(StateFilter(*QUESTION_STATES))
+async def handle_answer(message: types.Message, state: FSMContext, raw_state: str):
     if message.text == "Отмена":
         return await cancel(message, state)
-    await state.update_data(additional_info=message.text)
-    await finalize_case(message, state)
 
-@dp.message(Form.country_year)
-async def handle_country_year(message: types.Message, state: FSMContext):
-    if message.text == "Отмена":
-        return await cancel(message, state)
-    await state.update_data(country_year=message.text)
-    await message.answer("Есть ещё какая-то информация о боне?", reply_markup=cancel_keyboard())
-    await state.set_state(Form.info)
-
-@dp.message(Form.technique)
-async def handle_technique(message: types.Message, state: FSMContext):
-    if message.text == "Отмена":
-        return await cancel(message, state)
-    await state.update_data(technique=message.text)
-    await message.answer("Какой размер картины (в сантиметрах)?", reply_markup=cancel_keyboard())
-    await state.set_state(Form.size)
-
-@dp.message(Form.size)
-async def handle_size(message: types.Message, state: FSMContext):
-    if message.text == "Отмена":
-        return await cancel(message, state)
-    await state.update_data(size=message.text)
-    category = (await state.get_data())["category"]
-    if category == "Живопись":
-        await message.answer("Расскажи подробнее: страна, автор, происхождение, другая известная информация.", reply_markup=cancel_keyboard())
-        await state.set_state(Form.detailed_info)
-    else:
-        await message.answer("Есть ещё какая-то информация о предмете?", reply_markup=cancel_keyboard())
-        await state.set_state(Form.info)
-
-@dp.message(Form.detailed_info)
-async def handle_detailed_info(message: types.Message, state: FSMContext):
-    if message.text == "Отмена":
-        return await cancel(message, state)
-    await state.update_data(detailed_info=message.text)
-    await finalize_case(message, state)
+    data = await state.get_data()
+    transition = TRANSITIONS.get((data.get("category"), raw_state))
+    if transition is None:
+        await message.answer("Ошибка: данные неполные. Начните заново.")
+        await state.clear()
+        return
 
-@dp.message(Form.material_weight)
-async def handle_material_weight(message: types.Message, state: FSMContext):
-    if message.text == "Отмена":
-        return await cancel(message, state)
-    await state.update_data(material_weight=message.text)
-    await message.answer("Есть ещё какая-то информация о монете?", reply_markup=cancel_keyboard())
-    await state.set_state(Form.info)
+    field, next_step = transition
+    data[field] = message.text
+    if next_step is None:
+        return await finalize_case(message, state, data)
 
-@dp.message(Form.book_info)
-async def handle_book_info(message: types.Message, state: FSMContext):
-    if message.text == "Отмена":
-        return await cancel(message, state)
-    await state.update_data(book_info=message.text)
-    await finalize_case(message, state)
+    next_state, prompt = next_step
+    await state.set_data(data)
+    await message.answer(prompt, reply_markup=CANCEL_KEYBOARD)
+    await state.set_state(next_state)
 
 # Обработчик нажатия на inline-кнопку "Ответить"
-@dp.callback_query(ReplyCallback.filter())
+@dp.callback_query(ReplyCallback.filter(), F.from_user.id.in_(EXPERT_IDS))
 async def handle_reply_callback(callback: types.CallbackQuery, callback_data: ReplyCallback, state: FSMContext):
+    user_id = await repo.claim(callback_data.app_number, callback.from_user.id, experts.claim_timeout)
+    if user_id is None:
+        await callback.answer("Заявка уже закрыта или взята другим экспертом.", show_alert=True)
+        return
+
+    page_cache.invalidate(callback.from_user.id)
     await callback.answer("Готовлю ответ...")
     await bot.send_message(
         callback.from_user.id,
         "Введите предварительную оценку (например: «500–700 USD», «бесценно», «нужны дополнительные фото» и т.д.):"
     )
     await state.set_state(ExpertForm.summa)
-    await state.update_data(app_number=callback_data.app_number, user_id=callback_data.user_id)
+    await state.update_data(app_number=callback_data.app_number, user_id=user_id)
+
+# Панель эксперта: очередь, поиск и просмотр заявок.
+# Страницы кэшируются для каждого эксперта на DASHBOARD_CACHE_TTL секунд.
+page_cache = PageCache()
+
+async def dashboard_page(expert_id, kind, value, cursor=None, newer=False):
+    key = (expert_id, kind, value, cursor, newer)
+    page = page_cache.get(key)
+    if page is None:
+        page = await repo.search_applications(
+            **query_filters(kind, value, expert_id), cursor=cursor, newer=newer, limit=DASHBOARD_PAGE_SIZE
+        )
+        page_cache.put(key, page)
+    rows, more = page
+    return format_page(query_title(kind, value), rows), page_keyboard(kind, value, rows, more, cursor, newer)
+
+# Заявка целиком (текст, фото и кнопка ответа) — как при первой отправке
+async def open_application(expert_id, app_number):
+    app = await repo.get_application(app_number)
+    if app is None:
+        return False
+    submit_application(expert_id, app)
+    return True
+
+@dp.message(Command("queue"), F.from_user.id.in_(EXPERT_IDS))
+async def expert_queue(message: types.Message):
+    text, kb = await dashboard_page(message.from_user.id, "queue", "")
+    await message.answer(text, reply_markup=kb)
+
+@dp.message(Command("find"), F.from_user.id.in_(EXPERT_IDS))
+async def expert_find(message: types.Message, command: CommandObject):
+    query = parse_query(command.args)
+    if query is None:
+        await message.answer(FIND_HELP)
+        return
+    text, kb = await dashboard_page(message.from_user.id, *query)
+    await message.answer(text, reply_markup=kb)
+
+@dp.message(Command("app"), F.from_user.id.in_(EXPERT_IDS))
+async def expert_open(message: types.Message, command: CommandObject):
+    raw = (command.args or "").strip().lstrip("№")
+    if not raw.isdigit():
+        await message.answer("Укажите номер заявки, например: /app 123")
+        return
+    if not await open_application(message.from_user.id, int(raw)):
+        await message.answer(f"Заявка №{raw} не найдена.")
+
+@dp.callback_query(PageCallback.filter(), F.from_user.id.in_(EXPERT_IDS))
+async def expert_page(callback: types.CallbackQuery, callback_data: PageCallback):
+    text, kb = await dashboard_page(
+        callback.from_user.id, callback_data.kind, callback_data.value, callback_data.cursor, callback_data.newer
+    )
+    # Повторное нажатие на ту же кнопку: текст не изменился — это не ошибка
+    with contextlib.suppress(TelegramBadRequest):
+        await callback.message.edit_text(text, reply_markup=kb)
+    await callback.answer()
+
+@dp.callback_query(OpenCallback.filter(), F.from_user.id.in_(EXPERT_IDS))
+async def expert_open_button(callback: types.CallbackQuery, callback_data: OpenCallback):
+    if await open_application(callback.from_user.id, callback_data.app_number):
+        await callback.answer()
+    else:
+        await callback.answer("Заявка не найдена.", show_alert=True)
 
 # Ввод оценки экспертом
-@dp.message(ExpertForm.summa, F.from_user.id == EXPERT_ID)
+@dp.message(ExpertForm.summa, F.from_user.id.in_(EXPERT_IDS))
 async def handle_expert_summa(message: types.Message, state: FSMContext):
     data = await state.get_data()
     app_number = data.get("app_number")
@@ -357,108 +360,184 @@ async def handle_expert_summa(message: types.Message, state: FSMContext):
 
     summa = message.text.strip()
 
-    formatted_text = (
-        "✉️ <b>Ответ эксперта по вашей заявке №{app_number}</b>\n\n"
-        "🔍 <b>Предварительная оценка:</b>\n"
-        f"<i>{summa}</i>\n\n"
-        "📝 Эксперт изучил предоставленные фотографии и информацию.\n"
-        "Это ориентировочная стоимость на текущий момент.\n\n"
-        "Если у вас есть дополнительные вопросы или вы хотите обсудить продажу/покупку — напишите эксперту напрямую.\n\n"
-        "Спасибо, что обратились к нам! 🙏\n"
-        "Желаем удачи с вашим антиквариатом! ✨"
-    ).format(app_number=app_number)
+    # Сначала закрываем заявку за собой: если её уже передали другому эксперту,
+    # пользователь не получит второй, другой оценки
+    page_cache.invalidate(message.from_user.id)
+    if not await repo.answer(app_number, message.from_user.id):
+        await message.answer(f"Заявка №{app_number} уже передана другому эксперту или закрыта, оценка не отправлена.")
+        await state.clear()
+        return
+
+    formatted_text = EXPERT_ANSWER_TEMPLATE.format(app_number=app_number, summa=summa)
 
     try:
-        await bot.send_message(user_id, formatted_text, parse_mode="HTML")
+        await sender.send(
+            SendMessage(chat_id=user_id, text=formatted_text, parse_mode="HTML"),
+            f"оценка заявки №{app_number}"
+        )
         await message.answer(f"✅ Оценка отправлена пользователю:\n\n{summa}")
-        logging.info(f"Эксперт оценил заявку №{app_number} для пользователя {user_id}: {summa}")
+        logging.info(
+            f"Эксперт оценил заявку №{app_number} для пользователя {user_id}: {summa}",
+            extra={"app_number": app_number}
+        )
     except Exception as e:
+        # Оценка не ушла — заявка остаётся в работе у эксперта, можно ответить ещё раз
+        await repo.set_status(app_number, "claimed")
         await message.answer("❌ Ошибка при отправке оценки.")
-        logging.error(f"Ошибка отправки оценки заявки №{app_number}: {e}")
+        logging.error(f"Ошибка отправки оценки заявки №{app_number}: {e}", extra={"app_number": app_number})
 
     await state.clear()
 
+# Telegram принимает в одном альбоме не больше 10 фото
+MEDIA_GROUP_LIMIT = 10
+
+# Делит фото на альбомы примерно равного размера (15 → 8 + 7),
+# чтобы не осталось альбома из одного фото
+def split_photos(photos):
+    parts = -(-len(photos) // MEDIA_GROUP_LIMIT)
+    size = -(-len(photos) // parts) if parts else 0
+    return [photos[i:i + size] for i in range(0, len(photos), size)] if size else []
+
+# Отправка фото заявки: каждая часть — отдельная задача в очереди,
+# поэтому при ошибке повторяется только она
+def submit_photos(chat_id, app_number, photos):
+    chunks = split_photos(photos)
+    for index, chunk in enumerate(chunks, start=1):
+        caption = f"Заявка №{app_number} | Фото"
+        if len(chunks) > 1:
+            caption += f", часть {index} из {len(chunks)}"
+        description = f"фото заявки №{app_number}, часть {index}"
+
+        if len(chunk) == 1:
+            sender.submit(SendPhoto(chat_id=chat_id, photo=chunk[0], caption=caption), description)
+            continue
+
+        media_group = [types.InputMediaPhoto(media=chunk[0], caption=caption)]
+        media_group += [types.InputMediaPhoto(media=file_id) for file_id in chunk[1:]]
+        sender.submit(SendMediaGroup(chat_id=chat_id, media=media_group), description)
+
+# Inline-кнопка ответа на заявку для эксперта
+def reply_keyboard(app_number):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text="Ответить на заявку",
+            callback_data=ReplyCallback(app_number=app_number).pack()
+        )]
+    ])
+
+# Отправка заявки эксперту (в фоне, повторы и лимиты берёт на себя sender)
+def submit_application(expert_id, app):
+    app_number = app["id"]
+    text = APPLICATION_TEMPLATE.format(
+        app_number=app_number, category=app["category"], full_name=app["full_name"],
+        username=app["username"], user_id=app["user_id"]
+    )
+    text += "".join(f"{key}: {value}\n" for key, value in app["info"].items())
+
+    sender.submit(
+        SendMessage(chat_id=expert_id, text=text, reply_markup=reply_keyboard(app_number)), f"заявка №{app_number}"
+    )
+    submit_photos(expert_id, app_number, app["photos"])
+
+# Повторная отправка заявки, которую переложили на другого эксперта
+async def resend_application(expert_id, app_number):
+    app = await repo.get_application(app_number)
+    if app is not None:
+        submit_application(expert_id, app)
+
+# Напоминание эксперту, если заявку некому переложить (без повторной отправки фото)
+async def remind_expert(expert_id, app_number):
+    sender.submit(
+        SendMessage(
+            chat_id=expert_id, text=REMINDER_TEMPLATE.format(app_number=app_number),
+            reply_markup=reply_keyboard(app_number)
+        ),
+        f"напоминание по заявке №{app_number}"
+    )
+
+experts.on_reassign = resend_application
+experts.on_remind = remind_expert
+
+# Отпечатки недавних заявок → номер заявки. Апдейты пользователя всегда
+# обрабатывает один процесс, поэтому памяти процесса достаточно.
+submissions = TTLCache(DUPLICATE_WINDOW, DUPLICATE_CACHE_SIZE)
+
 # Финализация заявки
-async def finalize_case(message: types.Message, state: FSMContext):
-    data = await state.get_data()
+async def finalize_case(message: types.Message, state: FSMContext, data=None):
+    if data is None:
+        data = await state.get_data()
     if not data.get("category"):
         await message.answer("Ошибка: данные неполные. Начните заново.")
         await state.clear()
         return
 
-    photos = data.get("photos", [])
-    info_dict = {}
-    if "country_year" in data:
-        info_dict["Страна и год"] = data["country_year"]
-    if "technique" in data:
-        info_dict["Техника"] = data["technique"]
-    if "size" in data:
-        info_dict["Размер"] = data["size"]
-    if "detailed_info" in data:
-        info_dict["Подробно"] = data["detailed_info"]
-    if "material_weight" in data:
-        info_dict["Материал и вес"] = data["material_weight"]
-    if "book_info" in data:
-        info_dict["Книга"] = data["book_info"]
-    if "additional_info" in data:
-        info_dict["Дополнительно"] = data["additional_info"]
-
-    app_number = save_application(
-        user_id=message.from_user.id,
-        username=message.from_user.username,
-        full_name=message.from_user.full_name,
-        category=data["category"],
-        photos=photos,
-        info_dict=info_dict
-    )
-
-    text = f"Новая заявка №{app_number}\n\n"
-    text += f"Категория: {data['category']}\n"
-    text += f"Пользователь: {message.from_user.full_name} (@{message.from_user.username or 'нет'})\n"
-    text += f"ID: {message.from_user.id}\n\n"
-    for key, value in info_dict.items():
-        text += f"{key}: {value}\n"
+    # Та же заявка ещё раз (двойное нажатие, повторная отправка) — не сохраняем
+    digest = submission_digest(message.from_user.id, data)
+    duplicate = submissions.get(digest)
+    if duplicate is not None:
+        duplicates_total.inc()
+        logging.info(f"Повтор заявки №{duplicate} от {message.from_user.id}", extra={"app_number": duplicate})
+        await message.answer(DUPLICATE_TEXT, reply_markup=REMOVE_KEYBOARD)
+        await state.clear()
+        return
+    # Отпечаток занимаем до записи, чтобы параллельный повтор тоже отсеялся
+    submissions.put(digest, 0)
 
-    # Inline-кнопка для эксперта
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(
-            text="Ответить на заявку",
-            callback_data=ReplyCallback(app_number=app_number, user_id=message.from_user.id).pack()
-        )]
-    ])
+    photos = data.get("photos", [])
+    info_dict = build_info(data)
 
     try:
-        await bot.send_message(EXPERT_ID, text, reply_markup=kb)
-
-        if photos:
-            media_group = [types.InputMediaPhoto(media=file_id) for file_id in photos]
-            media_group[0].caption = f"Заявка №{app_number} | Фото"
-            await bot.send_media_group(EXPERT_ID, media_group)
-
-        logging.info(f"Заявка №{app_number} отправлена эксперту от {message.from_user.id}")
-    except Exception as e:
-        logging.error(f"Ошибка отправки эксперту: {e}")
-        await message.answer("Ошибка при отправке заявки. Попробуйте позже.")
-
-    await message.answer(
-        "Спасибо большое! 🙏 Твоя заявка отправлена эксперту.\n"
-        "Он изучит фото и информацию и скоро напишет тебе ответ.\n"
-        "Хорошего дня! ☀️",
-        reply_markup=ReplyKeyboardRemove()
+        app_number = await repo.save_application(
+            user_id=message.from_user.id,
+            username=message.from_user.username,
+            full_name=message.from_user.full_name,
+            category=data["category"],
+            photos=photos,
+            info_dict=info_dict
+        )
+    except Exception:
+        submissions.pop(digest)
+        raise
+    submissions.put(digest, app_number)
+
+    app = {
+        "id": app_number,
+        "user_id": message.from_user.id,
+        "username": message.from_user.username or "нет",
+        "full_name": message.from_user.full_name,
+        "category": data["category"],
+        "info": info_dict,
+        "photos": photos,
+    }
+    expert_id = await experts.assign(app_number, data["category"])
+    submit_application(expert_id, app)
+    archiver.wake()
+
+    logging.info(
+        f"Заявка №{app_number} поставлена в очередь эксперту {expert_id} от {message.from_user.id}",
+        extra={"app_number": app_number}
     )
+
+    await message.answer(THANKS_TEXT, reply_markup=REMOVE_KEYBOARD)
     await state.clear()
 
 # Некорректный ввод в состоянии фото
 @dp.message(Form.photos)
 async def invalid_in_photos(message: types.Message):
     if not message.photo and message.text not in ["Отправить ещё фото", "Продолжить", "Отмена"]:
-        await message.answer("Присылай фото или используй кнопки ниже.", reply_markup=photo_keyboard())
+        await message.answer("Присылай фото или используй кнопки ниже.", reply_markup=PHOTO_KEYBOARD)
 
 # Запуск
 async def main():
+    # Настройки вебхука проверяем до обращений к Telegram
+    if BOT_MODE == "webhook":
+        check_secret()
     await set_commands()
     try:
-        await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            await dp.start_polling(bot)
     except Exception as e:
         logging.error(f"Критическая ошибка бота: {e}")
 
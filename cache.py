@@ -0,0 +1,41 @@
+import time
+from collections import OrderedDict
+
+
+# Словарь с ограниченным размером и временем жизни записей: при переполнении
+# вытесняется то, к чему дольше всего не обращались, просроченное — при чтении.
+# Память не растёт с числом пользователей.
+class TTLCache:
+    def __init__(self, ttl, size):
+        self.ttl = ttl
+        self.size = size
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    # Запись заново отсчитывает время жизни
+    def put(self, key, value):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def pop(self, key):
+        item = self._items.pop(key, None)
+        return item[1] if item is not None else None
+
+    def discard_where(self, predicate):
+        for key in [key for key in self._items if predicate(key)]:
+            del self._items[key]
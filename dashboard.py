@@ -0,0 +1,166 @@
+import logging
+import os
+from datetime import datetime, timedelta
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import BotCommand, BotCommandScopeChat, InlineKeyboardButton, InlineKeyboardMarkup
+
+from cache import TTLCache
+from questionnaire import CATEGORIES
+
+# Заявок на одной странице панели эксперта
+DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", "10"))
+# Сколько секунд страница берётся из кэша, не обращаясь к БД
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "30"))
+DASHBOARD_CACHE_SIZE = int(os.getenv("DASHBOARD_CACHE_SIZE", "1000"))
+
+DATE_FORMAT = "%d.%m.%Y"
+OPEN_STATUSES = ("assigned", "claimed")
+CATEGORY_NAMES = list(CATEGORIES)
+
+STATUS_LABELS = {
+    "new": "новая",
+    "assigned": "ждёт ответа",
+    "claimed": "в работе",
+    "answered": "отвечена",
+}
+
+# Команды, которые видят только эксперты (в дополнение к общим)
+EXPERT_COMMANDS = [
+    BotCommand(command="queue", description="Мои заявки без ответа"),
+    BotCommand(command="find", description="Поиск: категория, ID пользователя или даты"),
+    BotCommand(command="app", description="Открыть заявку по номеру"),
+]
+
+FIND_HELP = (
+    "Поиск заявок:\n"
+    "/find Монеты — по категории\n"
+    "/find 123456789 — по ID пользователя\n"
+    "/find 01.05.2026 — за день\n"
+    "/find 01.05.2026-31.05.2026 — за период"
+)
+
+
+# Навигация по страницам. Сам запрос лежит в кнопке: kind — вид выборки,
+# value — её параметр (категория передаётся номером, чтобы влезть в 64 байта)
+class PageCallback(CallbackData, prefix="page"):
+    kind: str
+    value: str = ""
+    cursor: int | None = None
+    newer: bool = False
+
+
+class OpenCallback(CallbackData, prefix="open"):
+    app_number: int
+
+
+def _parse_date(raw):
+    return datetime.strptime(raw.strip(), DATE_FORMAT)
+
+
+# Текст после /find → (kind, value) или None, если запрос не понят
+def parse_query(text):
+    text = (text or "").strip()
+    if not text:
+        return None
+    if text.isdigit():
+        return "user", text
+    for index, name in enumerate(CATEGORY_NAMES):
+        if name.lower() == text.lower():
+            return "category", str(index)
+    parts = text.replace(" ", "-").split("-")
+    parts = [part for part in parts if part]
+    if len(parts) in (1, 2):
+        try:
+            since = _parse_date(parts[0])
+            until = _parse_date(parts[-1]) + timedelta(days=1)
+        except ValueError:
+            return None
+        if until <= since:
+            return None
+        return "dates", f"{int(since.timestamp())}-{int(until.timestamp())}"
+    return None
+
+
+# Параметры search_applications для выборки
+def query_filters(kind, value, expert_id):
+    if kind == "queue":
+        return {"expert_id": expert_id, "statuses": OPEN_STATUSES}
+    if kind == "category":
+        return {"category": CATEGORY_NAMES[int(value)]}
+    if kind == "user":
+        return {"user_id": int(value)}
+    if kind == "dates":
+        since, until = value.split("-")
+        return {"since": int(since), "until": int(until)}
+    raise ValueError(f"Неизвестная выборка: {kind}")
+
+
+def query_title(kind, value):
+    if kind == "queue":
+        return "Ваши заявки без ответа"
+    if kind == "category":
+        return f"Категория «{CATEGORY_NAMES[int(value)]}»"
+    if kind == "user":
+        return f"Заявки пользователя {value}"
+    since, until = (datetime.fromtimestamp(int(ts)) for ts in value.split("-"))
+    return f"Заявки с {since.strftime(DATE_FORMAT)} по {(until - timedelta(days=1)).strftime(DATE_FORMAT)}"
+
+
+# Короткоживущий кэш страниц: ключ начинается с id эксперта
+class PageCache(TTLCache):
+    def __init__(self, ttl=DASHBOARD_CACHE_TTL, size=DASHBOARD_CACHE_SIZE):
+        super().__init__(ttl, size)
+
+    # Сбросить страницы эксперта (например, после его ответа на заявку)
+    def invalidate(self, expert_id):
+        self.discard_where(lambda key: key[0] == expert_id)
+
+
+def format_page(title, rows):
+    if not rows:
+        return f"{title}\n\nНичего не найдено."
+    lines = [f"{title}\n"]
+    for row in rows:
+        created = datetime.fromtimestamp(row["created_at"]).strftime("%d.%m.%Y %H:%M") if row["created_at"] else "—"
+        status = STATUS_LABELS.get(row["status"], row["status"])
+        lines.append(f"№{row['id']} · {row['category']} · {created} · {status}\n    {row['full_name']} ({row['user_id']})")
+    return "\n".join(lines)
+
+
+# Кнопки открытия заявок и навигации «новее / старее».
+# Листаем к старым — назад к новым можно, если пришли не с первой страницы.
+def page_keyboard(kind, value, rows, more, cursor, newer):
+    has_newer = more if newer else cursor is not None
+    has_older = True if newer else more
+
+    kb = []
+    buttons = [
+        InlineKeyboardButton(text=f"№{row['id']}", callback_data=OpenCallback(app_number=row["id"]).pack())
+        for row in rows
+    ]
+    kb += [buttons[i:i + 5] for i in range(0, len(buttons), 5)]
+
+    navigation = []
+    if rows and has_newer:
+        navigation.append(InlineKeyboardButton(
+            text="← Новее",
+            callback_data=PageCallback(kind=kind, value=value, cursor=rows[0]["id"], newer=True).pack()
+        ))
+    if rows and has_older:
+        navigation.append(InlineKeyboardButton(
+            text="Старее →",
+            callback_data=PageCallback(kind=kind, value=value, cursor=rows[-1]["id"]).pack()
+        ))
+    if navigation:
+        kb.append(navigation)
+    return InlineKeyboardMarkup(inline_keyboard=kb) if kb else None
+
+
+# Меню с командами панели — только в чатах экспертов
+async def set_expert_commands(bot, common_commands, expert_ids):
+    for expert_id in expert_ids:
+        try:
+            await bot.set_my_commands(common_commands + EXPERT_COMMANDS, scope=BotCommandScopeChat(chat_id=expert_id))
+        except Exception as e:
+            logging.warning(f"Не удалось задать меню эксперту {expert_id}: {e}")
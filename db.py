@@ -0,0 +1,329 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import db_batch_size, db_write_latency
+from migrations import migrate
+
+# Сколько заявок максимум пишется одним коммитом
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "50"))
+# Сколько ждём (в секундах), пока накопится пачка заявок
+DB_BATCH_DELAY = float(os.getenv("DB_BATCH_DELAY", "0.005"))
+
+DB_FILE = "applications.db"
+
+
+def connect(db_file):
+    conn = sqlite3.connect(db_file, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+# Миграции без запуска репозитория: при нескольких процессах их выполняет
+# супервизор до старта рабочих, иначе рабочие мигрируют одну базу наперегонки
+def migrate_database(db_file):
+    conn = connect(db_file)
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
+
+
+# Хранилище заявок: одно долгоживущее соединение SQLite (WAL) в отдельном потоке
+# и очередь записи, которая коммитит несколько заявок разом.
+# Event loop бота при этом не блокируется.
+class ApplicationRepository:
+    def __init__(self, db_file, batch_size=DB_BATCH_SIZE, batch_delay=DB_BATCH_DELAY):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self._executor = None
+        self._conn = None
+        self._queue = None
+        self._writer_task = None
+
+    # Все обращения к соединению идут через один поток
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self):
+        return connect(self.db_file)
+
+    async def start(self):
+        if self._conn is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+        self._conn = await self.run(self._connect)
+        await self.run(migrate, self._conn)
+        self._queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._writer())
+
+    async def stop(self):
+        if self._conn is None:
+            return
+        # None — сигнал писателю: дописать очередь и завершиться
+        await self._queue.put(None)
+        await self._writer_task
+        await self.run(self._conn.close)
+        self._executor.shutdown(wait=True)
+        self._conn = None
+        self._executor = None
+        self._queue = None
+        self._writer_task = None
+
+    # Сохранение заявки, возвращает номер заявки (id строки)
+    async def save_application(self, user_id, username, full_name, category, photos, info_dict):
+        row = (
+            user_id, username or "нет", full_name, category,
+            int(time.time()), json.dumps(info_dict, ensure_ascii=False)
+        )
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(((row, list(photos or [])), future))
+        return await future
+
+    async def set_status(self, app_id, status):
+        def update():
+            with self._conn:
+                self._conn.execute("UPDATE applications SET status = ? WHERE id = ?", (status, app_id))
+        await self.run(update)
+
+    # Заявка целиком, вместе с фото — для повторной отправки эксперту
+    async def get_application(self, app_id):
+        def fetch():
+            cursor = self._conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            row = cursor.execute("SELECT * FROM applications WHERE id = ?", (app_id,)).fetchone()
+            if row is None:
+                return None
+            photos = [r[0] for r in self._conn.execute(
+                "SELECT file_id FROM application_photos WHERE application_id = ? ORDER BY position", (app_id,)
+            )]
+            app = dict(row)
+            app["info"] = json.loads(app.pop("info_json") or "{}")
+            app["photos"] = photos
+            return app
+        return await self.run(fetch)
+
+    async def assign(self, app_id, expert_id):
+        def update():
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE applications SET expert_id = ?, assigned_at = ?, status = 'assigned' WHERE id = ?",
+                    (expert_id, int(time.time()), app_id)
+                )
+        await self.run(update)
+
+    # Продлевает назначение, не меняя эксперта и статус
+    async def touch_assignment(self, app_id):
+        def update():
+            with self._conn:
+                self._conn.execute("UPDATE applications SET assigned_at = ? WHERE id = ?", (int(time.time()), app_id))
+        await self.run(update)
+
+    # Эксперт берёт заявку в работу. Удаётся, если заявка назначена ему
+    # или её назначение просрочено. Возвращает user_id автора или None.
+    async def claim(self, app_id, expert_id, timeout):
+        def update():
+            now = int(time.time())
+            with self._conn:
+                c = self._conn.execute('''
+                    UPDATE applications SET expert_id = ?, assigned_at = ?, status = 'claimed'
+                    WHERE id = ? AND status IN ('new', 'assigned', 'claimed')
+                      AND (expert_id IS NULL OR expert_id = ? OR assigned_at < ?)
+                ''', (expert_id, now, app_id, expert_id, now - timeout))
+                if c.rowcount == 0:
+                    return None
+                return self._conn.execute("SELECT user_id FROM applications WHERE id = ?", (app_id,)).fetchone()[0]
+        return await self.run(update)
+
+    # Эксперт отвечает на заявку. Удаётся, только если заявка всё ещё у него в работе:
+    # после переназначения прежний эксперт ответить уже не может.
+    async def answer(self, app_id, expert_id):
+        def update():
+            with self._conn:
+                c = self._conn.execute(
+                    "UPDATE applications SET status = 'answered' WHERE id = ? AND expert_id = ? AND status = 'claimed'",
+                    (app_id, expert_id)
+                )
+                return c.rowcount == 1
+        return await self.run(update)
+
+    # Сколько незакрытых заявок у каждого эксперта
+    async def expert_loads(self, expert_ids):
+        def fetch():
+            loads = dict.fromkeys(expert_ids, 0)
+            rows = self._conn.execute('''
+                SELECT expert_id, COUNT(*) FROM applications
+                WHERE status IN ('assigned', 'claimed') GROUP BY expert_id
+            ''')
+            for expert_id, count in rows:
+                if expert_id in loads:
+                    loads[expert_id] = count
+            return loads
+        return await self.run(fetch)
+
+    # Заявки, которые слишком долго ждут назначенного эксперта
+    async def stale_assignments(self, timeout, limit=100):
+        def fetch():
+            return self._conn.execute('''
+                SELECT id, category, expert_id FROM applications
+                WHERE status IN ('assigned', 'claimed') AND assigned_at < ?
+                ORDER BY assigned_at LIMIT ?
+            ''', (int(time.time()) - timeout, limit)).fetchall()
+        return await self.run(fetch)
+
+    # Страница заявок для панели эксперта. Пагинация по ключу (id), без OFFSET:
+    # каждая страница — один проход по индексу от cursor. newer=True — листаем
+    # к более новым заявкам. Возвращает (строки от новых к старым, есть ли ещё).
+    async def search_applications(self, expert_id=None, statuses=None, category=None, user_id=None,
+                                  since=None, until=None, cursor=None, newer=False, limit=10):
+        def fetch():
+            where, params = [], []
+            if expert_id is not None:
+                where.append("expert_id = ?")
+                params.append(expert_id)
+            if statuses:
+                where.append(f"status IN ({', '.join('?' * len(statuses))})")
+                params.extend(statuses)
+            if category is not None:
+                where.append("category = ?")
+                params.append(category)
+            if user_id is not None:
+                where.append("user_id = ?")
+                params.append(user_id)
+            # Период переводим в диапазон id по индексу created_at: заявки
+            # нумеруются по времени, и дальше листаем по первичному ключу.
+            # Сам created_at тоже проверяем: внутри диапазона id могут быть строки
+            # вне периода (старые заявки без даты, сдвиг часов)
+            if since is not None or until is not None:
+                low, high = self._id_range(since, until)
+                if low is None:
+                    return [], False
+                where.append("id BETWEEN ? AND ?")
+                params.extend((low, high))
+                if since is not None:
+                    where.append("created_at >= ?")
+                    params.append(since)
+                if until is not None:
+                    where.append("created_at < ?")
+                    params.append(until)
+            if cursor is not None:
+                where.append("id > ?" if newer else "id < ?")
+                params.append(cursor)
+
+            cur = self._conn.cursor()
+            cur.row_factory = sqlite3.Row
+            rows = cur.execute(f'''
+                SELECT id, user_id, username, full_name, category, created_at, status, expert_id
+                FROM applications {"WHERE " + " AND ".join(where) if where else ""}
+                ORDER BY id {"ASC" if newer else "DESC"} LIMIT ?
+            ''', (*params, limit + 1)).fetchall()
+            more = len(rows) > limit
+            rows = [dict(row) for row in rows[:limit]]
+            if newer:
+                rows.reverse()
+            return rows, more
+        return await self.run(fetch)
+
+    def _id_range(self, since, until):
+        conditions, params = [], []
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(until)
+        where = " AND ".join(conditions)
+        low = self._conn.execute(
+            f"SELECT id FROM applications WHERE {where} ORDER BY created_at, id LIMIT 1", params
+        ).fetchone()
+        if low is None:
+            return None, None
+        high = self._conn.execute(
+            f"SELECT id FROM applications WHERE {where} ORDER BY created_at DESC, id DESC LIMIT 1", params
+        ).fetchone()
+        return low[0], high[0]
+
+    # Фото, которые ещё не скачаны в архив (в порядке поступления заявок)
+    async def pending_photos(self, max_attempts, limit=100):
+        def fetch():
+            return self._conn.execute('''
+                SELECT application_id, position, file_id FROM application_photos
+                WHERE archived_at IS NULL AND attempts < ?
+                ORDER BY application_id, position LIMIT ?
+            ''', (max_attempts, limit)).fetchall()
+        return await self.run(fetch)
+
+    async def mark_photo_archived(self, app_id, position, sha256, path, thumb_path):
+        def update():
+            with self._conn:
+                self._conn.execute('''
+                    UPDATE application_photos SET sha256 = ?, path = ?, thumb_path = ?, archived_at = ?
+                    WHERE application_id = ? AND position = ?
+                ''', (sha256, path, thumb_path, int(time.time()), app_id, position))
+        await self.run(update)
+
+    async def mark_photo_failed(self, app_id, position):
+        def update():
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE application_photos SET attempts = attempts + 1 WHERE application_id = ? AND position = ?",
+                    (app_id, position)
+                )
+        await self.run(update)
+
+    def _insert_batch(self, items):
+        ids = []
+        with self._conn:
+            for row, photos in items:
+                c = self._conn.execute('''
+                    INSERT INTO applications (user_id, username, full_name, category, created_at, info_json)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', row)
+                app_id = c.lastrowid
+                self._conn.executemany(
+                    "INSERT INTO application_photos (application_id, position, file_id) VALUES (?, ?, ?)",
+                    [(app_id, position, file_id) for position, file_id in enumerate(photos)]
+                )
+                ids.append(app_id)
+        return ids
+
+    async def _writer(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+
+            # Даём соседним заявкам шанс попасть в тот же коммит
+            if self.batch_delay and self._queue.empty():
+                await asyncio.sleep(self.batch_delay)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                with db_write_latency.time():
+                    ids = await self.run(self._insert_batch, [item for item, _ in batch])
+                db_batch_size.observe(len(batch))
+            except Exception as e:
+                logging.error(f"Ошибка записи заявок в БД: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), app_id in zip(batch, ids):
+                if not future.done():
+                    future.set_result(app_id)
@@ -0,0 +1,111 @@
+import asyncio
+import contextlib
+import logging
+import os
+
+# Как выбирать эксперта: least_loaded (меньше всего открытых заявок) или round_robin.
+# Очередь round_robin хранится в памяти процесса, поэтому при WORKERS > 1
+# поддерживается только least_loaded: нагрузку он читает из общей БД.
+EXPERT_DISPATCH = os.getenv("EXPERT_DISPATCH", "least_loaded")
+# Через сколько секунд неотвеченная заявка уходит другому эксперту
+CLAIM_TIMEOUT = int(os.getenv("CLAIM_TIMEOUT", "3600"))
+# Как часто (в секундах) ищем просроченные заявки
+REASSIGN_INTERVAL = int(os.getenv("REASSIGN_INTERVAL", "60"))
+
+
+# "111, 222" → [111, 222]
+def parse_ids(raw):
+    return [int(part) for part in (raw or "").split(",") if part.strip()]
+
+
+# "Монеты=111,222;Живопись=333" → {"Монеты": [111, 222], "Живопись": [333]}
+def parse_categories(raw):
+    categories = {}
+    for item in (raw or "").split(";"):
+        if "=" in item:
+            category, ids = item.split("=", 1)
+            categories[category.strip()] = parse_ids(ids)
+    return categories
+
+
+# Без экспертов заявку некому отдать: она сохранится, но пользователь не получит
+# ответа. Поэтому пустые настройки останавливают запуск, а не первую заявку.
+def check_experts(expert_ids, categories):
+    if not expert_ids:
+        raise SystemExit("Не заданы эксперты: укажите EXPERT_IDS (или EXPERT_ID)")
+    empty = [category for category, ids in categories.items() if not ids]
+    if empty:
+        raise SystemExit(f"В EXPERT_CATEGORIES не указаны эксперты для категорий: {', '.join(empty)}")
+
+
+# Пул экспертов: выбирает, кому отдать заявку, и перекладывает заявки,
+# которые слишком долго лежат без ответа. Очередь хранится в таблице applications.
+class ExpertPool:
+    def __init__(self, repo, expert_ids, categories=None, strategy=EXPERT_DISPATCH, claim_timeout=CLAIM_TIMEOUT):
+        self.repo = repo
+        self.expert_ids = list(expert_ids)
+        self.categories = categories or {}
+        self.strategy = strategy
+        self.claim_timeout = claim_timeout
+        # async (expert_id, app_id) — вызывается при переназначении заявки
+        self.on_reassign = None
+        # async (expert_id, app_id) — напоминание, если передать заявку некому
+        self.on_remind = None
+        # Сдвиг очереди по категориям — свой в каждом процессе
+        self._turns = {}
+        self._task = None
+
+    def candidates(self, category, exclude=None):
+        ids = self.categories.get(category) or self.expert_ids
+        if exclude is not None and len(ids) > 1:
+            ids = [expert_id for expert_id in ids if expert_id != exclude]
+        return ids
+
+    async def pick(self, category, exclude=None):
+        ids = self.candidates(category, exclude)
+        turn = self._turns.get(category, 0)
+        self._turns[category] = turn + 1
+        # Сдвигаем список по кругу, чтобы при равной нагрузке эксперты чередовались
+        ids = ids[turn % len(ids):] + ids[:turn % len(ids)]
+        if self.strategy == "round_robin" or len(ids) == 1:
+            return ids[0]
+        loads = await self.repo.expert_loads(ids)
+        return min(ids, key=lambda expert_id: loads[expert_id])
+
+    async def assign(self, app_id, category, exclude=None):
+        expert_id = await self.pick(category, exclude)
+        await self.repo.assign(app_id, expert_id)
+        return expert_id
+
+    async def reassign_stale(self):
+        for app_id, category, expert_id in await self.repo.stale_assignments(self.claim_timeout):
+            # Другого эксперта нет: заявка остаётся у него (и в работе, если он её взял),
+            # отсчёт начинается заново, а эксперту уходит короткое напоминание
+            if not [candidate for candidate in self.candidates(category) if candidate != expert_id]:
+                await self.repo.touch_assignment(app_id)
+                logging.info(f"Заявка №{app_id} без ответа, напоминание эксперту {expert_id}")
+                if self.on_remind is not None:
+                    await self.on_remind(expert_id, app_id)
+                continue
+            new_expert_id = await self.assign(app_id, category, exclude=expert_id)
+            logging.info(f"Заявка №{app_id} переназначена: {expert_id} → {new_expert_id}")
+            if self.on_reassign is not None:
+                await self.on_reassign(new_expert_id, app_id)
+
+    async def _reassign_loop(self):
+        while True:
+            await asyncio.sleep(REASSIGN_INTERVAL)
+            try:
+                await self.reassign_stale()
+            except Exception as e:
+                logging.error(f"Ошибка переназначения заявок: {e}")
+
+    async def start(self):
+        self._task = asyncio.create_task(self._reassign_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
@@ -0,0 +1,223 @@
+# Выгрузка заявок для отчётов, не останавливая бота:
+#
+#   python export.py -o applications.csv
+#   python export.py -f jsonl --gzip -o applications.jsonl.gz
+#   python export.py -f parquet -o applications.parquet      (нужен pyarrow)
+#   python export.py -o new.csv --state export.state          (только новые заявки)
+#
+# Читает БД через отдельное соединение только для чтения пачками по id
+# (keyset), поэтому память не растёт с размером таблицы, а запись бота (WAL)
+# не блокируется. Старые строки (info/photos/timestamp текстом) разбираются
+# на лету, даже если база ещё не прошла миграции.
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+from migrations import parse_legacy_info, parse_legacy_photos, parse_legacy_timestamp
+
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "1000"))
+
+FIELDS = ["id", "created_at", "user_id", "username", "full_name", "category", "status", "expert_id", "info", "photos"]
+FORMATS = ("csv", "jsonl", "parquet")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Выгрузка заявок в CSV, JSONL или Parquet")
+    parser.add_argument("--db", default="applications.db", help="файл базы заявок")
+    parser.add_argument("-o", "--output", default="-", help="куда писать (- — stdout)")
+    parser.add_argument("-f", "--format", choices=FORMATS, help="формат (по умолчанию — по расширению файла)")
+    parser.add_argument("--gzip", action="store_true", help="сжать gzip (включается и по расширению .gz)")
+    parser.add_argument("--since-id", type=int, help="выгрузить заявки с id больше этого")
+    parser.add_argument("--state", help="файл с последним выгруженным id для инкрементальной выгрузки")
+    parser.add_argument("--batch", type=int, default=EXPORT_BATCH, help="строк в одной пачке")
+    return parser.parse_args()
+
+
+def connect(path):
+    if not os.path.exists(path):
+        raise SystemExit(f"База {path} не найдена")
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+# Колонки, которых нет в базе (старая схема или новая без старых полей), читаются как NULL
+def _select(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(applications)")}
+    names = ["id", "user_id", "username", "full_name", "category",
+             "created_at", "info_json", "status", "expert_id", "photos", "info", "timestamp"]
+    return ", ".join(name if name in columns else f"NULL AS {name}" for name in names)
+
+
+def _has_photo_table(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'application_photos'"
+    ).fetchone() is not None
+
+
+def _photos(conn, first_id, last_id):
+    photos = {}
+    rows = conn.execute('''
+        SELECT application_id, file_id FROM application_photos
+        WHERE application_id BETWEEN ? AND ? ORDER BY application_id, position
+    ''', (first_id, last_id))
+    for app_id, file_id in rows:
+        photos.setdefault(app_id, []).append(file_id)
+    return photos
+
+
+def _record(row, photos):
+    (app_id, user_id, username, full_name, category,
+     created_at, info_json, status, expert_id, legacy_photos, legacy_info, legacy_timestamp) = row
+    if created_at is None:
+        created_at = parse_legacy_timestamp(legacy_timestamp)
+    return {
+        "id": app_id,
+        "created_at": datetime.fromtimestamp(created_at).isoformat() if created_at else None,
+        "user_id": user_id,
+        "username": username,
+        "full_name": full_name,
+        "category": category,
+        "status": status or "new",
+        "expert_id": expert_id,
+        "info": json.loads(info_json) if info_json else parse_legacy_info(legacy_info),
+        "photos": photos.get(app_id) or parse_legacy_photos(legacy_photos),
+    }
+
+
+# Пачки записей по возрастанию id. Каждая пачка — отдельный короткий запрос,
+# долгой читающей транзакции нет. Верхняя граница фиксируется в начале,
+# чтобы заявки, пришедшие во время выгрузки, попали в следующую.
+def iter_batches(conn, since_id=0, batch=EXPORT_BATCH):
+    select = _select(conn)
+    photo_table = _has_photo_table(conn)
+    upper = conn.execute("SELECT MAX(id) FROM applications").fetchone()[0] or 0
+    last_id = since_id
+    while last_id < upper:
+        rows = conn.execute(
+            f"SELECT {select} FROM applications WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+            (last_id, upper, batch)
+        ).fetchall()
+        if not rows:
+            break
+        photos = _photos(conn, rows[0][0], rows[-1][0]) if photo_table else {}
+        yield [_record(row, photos) for row in rows]
+        last_id = rows[-1][0]
+
+
+def write_csv(stream, batches):
+    writer = csv.DictWriter(stream, fieldnames=FIELDS)
+    writer.writeheader()
+    for records in batches:
+        for record in records:
+            record["info"] = json.dumps(record["info"], ensure_ascii=False)
+            record["photos"] = " ".join(record["photos"])
+            writer.writerow(record)
+
+
+def write_jsonl(stream, batches):
+    for records in batches:
+        for record in records:
+            stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+# Колоночный формат: каждая пачка — отдельная row group, целиком таблица в памяти не держится
+def write_parquet(path, batches, compress):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Для формата parquet нужен pyarrow: pip install pyarrow")
+
+    schema = pa.schema([
+        ("id", pa.int64()), ("created_at", pa.string()), ("user_id", pa.int64()),
+        ("username", pa.string()), ("full_name", pa.string()), ("category", pa.string()),
+        ("status", pa.string()), ("expert_id", pa.int64()), ("info", pa.string()),
+        ("photos", pa.list_(pa.string())),
+    ])
+    with pq.ParquetWriter(path, schema, compression="gzip" if compress else "snappy") as writer:
+        for records in batches:
+            for record in records:
+                record["info"] = json.dumps(record["info"], ensure_ascii=False)
+            writer.write_table(pa.Table.from_pylist(records, schema=schema))
+
+
+def read_state(path):
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("last_id", 0)
+
+
+def write_state(path, last_id):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"last_id": last_id, "exported_at": datetime.now().isoformat(timespec="seconds")}, f)
+    os.replace(tmp_path, path)
+
+
+# Считает выгруженные строки и последний id, не задерживая пачки
+def _tracked(batches, progress):
+    for records in batches:
+        progress["rows"] += len(records)
+        progress["last_id"] = records[-1]["id"]
+        yield records
+
+
+def export(conn, output, fmt, compress, since_id=0, batch=EXPORT_BATCH):
+    progress = {"rows": 0, "last_id": since_id}
+    batches = _tracked(iter_batches(conn, since_id, batch), progress)
+
+    # В файл пишем через временный, чтобы не оставить обрывок при ошибке
+    tmp_path = None if output == "-" else f"{output}.part"
+    try:
+        if fmt == "parquet":
+            if tmp_path is None:
+                raise SystemExit("Parquet пишется только в файл, укажите -o")
+            write_parquet(tmp_path, batches, compress)
+        else:
+            raw = sys.stdout.buffer if tmp_path is None else open(tmp_path, "wb")
+            binary = gzip.GzipFile(fileobj=raw, mode="wb") if compress else raw
+            stream = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+            try:
+                (write_csv if fmt == "csv" else write_jsonl)(stream, batches)
+                stream.flush()
+            finally:
+                stream.detach()
+                if compress:
+                    binary.close()
+                if tmp_path is not None:
+                    raw.close()
+        if tmp_path is not None:
+            os.replace(tmp_path, output)
+    except BaseException:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return progress["rows"], progress["last_id"]
+
+
+def main(args):
+    name = args.output[:-3] if args.output.endswith(".gz") else args.output
+    fmt = args.format or {".jsonl": "jsonl", ".parquet": "parquet"}.get(os.path.splitext(name)[1], "csv")
+    compress = args.gzip or args.output.endswith(".gz")
+    since_id = args.since_id if args.since_id is not None else read_state(args.state)
+
+    conn = connect(args.db)
+    try:
+        rows, last_id = export(conn, args.output, fmt, compress, since_id, args.batch)
+    finally:
+        conn.close()
+    if args.state:
+        write_state(args.state, last_id)
+    print(f"Выгружено заявок: {rows}, последний id: {last_id}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main(parse_args())
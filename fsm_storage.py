@@ -0,0 +1,182 @@
+import asyncio
+import copy
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+from aiogram.fsm.storage.memory import MemoryStorage
+
+
+# FSM-хранилище в локальном файле SQLite (WAL).
+# Состояние и данные пользователя переживают перезапуск бота.
+class SQLiteStorage(BaseStorage):
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm")
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fsm (
+                    key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data TEXT NOT NULL DEFAULT '{}'
+                )
+            ''')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _fetch(self, key, column):
+        row = self._connection().execute(f"SELECT {column} FROM fsm WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _store(self, key, column, value):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                f"INSERT INTO fsm (key, {column}) VALUES (?, ?) "
+                f"ON CONFLICT(key) DO UPDATE SET {column} = excluded.{column}",
+                (key, value)
+            )
+
+    def _fetch_record(self, key):
+        row = self._connection().execute("SELECT state, data FROM fsm WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, {}
+        return row[0], json.loads(row[1]) if row[1] else {}
+
+    def _store_record(self, key, state, data):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO fsm (key, state, data) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data",
+                (key, state, data)
+            )
+
+    # Состояние и данные лежат в одной строке и читаются/пишутся вместе:
+    # одно обращение к базе на чтение и одна транзакция на запись
+    async def get_record(self, key):
+        return await self._run(self._fetch_record, self.key_builder.build(key))
+
+    async def set_record(self, key, state, data):
+        state = state.state if isinstance(state, State) else state
+        await self._run(
+            self._store_record, self.key_builder.build(key), state, json.dumps(dict(data), ensure_ascii=False)
+        )
+
+    async def set_state(self, key, state=None):
+        state = state.state if isinstance(state, State) else state
+        await self._run(self._store, self.key_builder.build(key), "state", state)
+
+    async def get_state(self, key):
+        return await self._run(self._fetch, self.key_builder.build(key), "state")
+
+    async def set_data(self, key, data):
+        await self._run(self._store, self.key_builder.build(key), "data", json.dumps(dict(data), ensure_ascii=False))
+
+    async def get_data(self, key):
+        raw = await self._run(self._fetch, self.key_builder.build(key), "data")
+        return json.loads(raw) if raw else {}
+
+    async def close(self):
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+
+# Выбор хранилища по строке из FSM_STORAGE:
+#   memory                       — в памяти процесса (для разработки)
+#   sqlite:///fsm.db             — локальный файл SQLite
+#   redis://localhost:6379/0     — Redis или совместимый сервер (нужен пакет redis)
+def create_storage(url):
+    if not url or url == "memory":
+        return MemoryStorage()
+    if url.startswith("sqlite:///"):
+        return SQLiteStorage(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(url, key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True))
+    raise ValueError(f"Неизвестное FSM-хранилище: {url}")
+
+
+_MISSING = object()
+
+
+# FSMContext, который в пределах одного апдейта читает хранилище один раз —
+# в load(), а записывает тоже один раз — в flush(). SQLiteStorage отдаёт и
+# сохраняет состояние вместе с данными; у других хранилищ данные читаются
+# при первом обращении.
+class BufferedFSMContext(FSMContext):
+    def __init__(self, storage, key):
+        super().__init__(storage, key)
+        self._state = _MISSING
+        self._data = _MISSING
+        self._state_changed = False
+        self._data_changed = False
+
+    async def load(self):
+        if isinstance(self.storage, SQLiteStorage):
+            self._state, self._data = await self.storage.get_record(self.key)
+        else:
+            self._state = await self.storage.get_state(key=self.key)
+        return self._state
+
+    async def set_state(self, state=None):
+        self._state = state.state if isinstance(state, State) else state
+        self._state_changed = True
+
+    async def get_state(self):
+        if self._state is _MISSING:
+            self._state = await self.storage.get_state(key=self.key)
+        return self._state
+
+    async def set_data(self, data):
+        self._data = dict(data)
+        self._data_changed = True
+
+    async def get_data(self):
+        if self._data is _MISSING:
+            self._data = await self.storage.get_data(key=self.key)
+        return copy.deepcopy(self._data)
+
+    async def get_value(self, key, default=None):
+        data = await self.get_data()
+        return data.get(key, default)
+
+    async def update_data(self, data=None, **kwargs):
+        if data:
+            kwargs.update(data)
+        current = await self.get_data()
+        current.update(kwargs)
+        self._data = current
+        self._data_changed = True
+        return copy.deepcopy(current)
+
+    async def flush(self):
+        if isinstance(self.storage, SQLiteStorage):
+            if self._state_changed or self._data_changed:
+                await self.storage.set_record(self.key, await self.get_state(), await self.get_data())
+                self._state_changed = self._data_changed = False
+            return
+        if self._state_changed:
+            await self.storage.set_state(key=self.key, state=self._state)
+            self._state_changed = False
+        if self._data_changed:
+            await self.storage.set_data(key=self.key, data=self._data)
+            self._data_changed = False
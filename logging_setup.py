@@ -0,0 +1,102 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Ротация: size (по размеру файла) или time (по времени, см. LOG_ROTATE_WHEN)
+LOG_ROTATE = os.getenv("LOG_ROTATE", "size")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "7"))
+# Сэмплирование частых событий: из логгеров LOG_SAMPLE_LOGGERS записи уровня
+# LOG_SAMPLE_LEVEL и ниже попадают в лог с вероятностью LOG_SAMPLE_RATE
+LOG_SAMPLE_LOGGERS = os.getenv("LOG_SAMPLE_LOGGERS", "aiogram.event,handlers")
+LOG_SAMPLE_LEVEL = os.getenv("LOG_SAMPLE_LEVEL", "INFO")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+# Поля, которые попадают в JSON, если они есть у записи
+CONTEXT_FIELDS = ("app_number", "user_id", "handler", "latency")
+
+# Контекст текущего апдейта (user_id, handler), его заполняет middleware
+log_context = ContextVar("log_context", default={})
+
+
+# Дописывает к записи поля из контекста апдейта
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        for key, value in log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, loggers, level, rate):
+        super().__init__()
+        self.loggers = tuple(name.strip() for name in loggers.split(",") if name.strip())
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate >= 1 or record.levelno > self.level:
+            return True
+        if not record.name.startswith(self.loggers):
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _file_handler():
+    if LOG_ROTATE == "time":
+        handler = logging.handlers.TimedRotatingFileHandler(
+            LOG_FILE, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+# Логирование через очередь: хендлеры бота только кладут запись в очередь,
+# а пишет в файл отдельный поток QueueListener
+def setup_logging():
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_LOGGERS, LOG_SAMPLE_LEVEL, LOG_SAMPLE_RATE))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, _file_handler(), respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,211 @@
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from collections import defaultdict
+
+from aiohttp import web
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+# Порт HTTP-эндпоинта /metrics в формате Prometheus (0 — выключен)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+# Как часто (в секундах) писать сводку метрик в лог (0 — не писать)
+METRICS_LOG_INTERVAL = int(os.getenv("METRICS_LOG_INTERVAL", "300"))
+
+# Границы корзин гистограмм, в секундах
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        self.values[_labels(labels)] += amount
+
+    def render(self):
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(labels)} {value}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels → [счётчики по корзинам..., count, sum, max]
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = _labels(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [0] * len(self.buckets) + [0, 0.0, 0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        n = len(self.buckets)
+        series[n] += 1
+        series[n + 1] += value
+        series[n + 2] = max(series[n + 2], value)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        n = len(self.buckets)
+        for labels, series in self.values.items():
+            for bound, count in zip(self.buckets, series):
+                yield f"{self.name}_bucket{_format_labels(labels, [('le', bound)])} {count}"
+            yield f"{self.name}_bucket{_format_labels(labels, [('le', '+Inf')])} {series[n]}"
+            yield f"{self.name}_count{_format_labels(labels)} {series[n]}"
+            yield f"{self.name}_sum{_format_labels(labels)} {series[n + 1]}"
+
+    # Краткая сводка для лога: число, среднее и максимум по каждой серии
+    def summary(self):
+        n = len(self.buckets)
+        for labels, series in self.values.items():
+            count, total, peak = series[n], series[n + 1], series[n + 2]
+            yield f"{self.name}{_format_labels(labels)} n={count} avg={total / count:.4f} max={peak:.4f}"
+
+
+# Значение, которое считается в момент запроса (например, глубина очереди)
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help, func):
+        self.name = name
+        self.help = help
+        self.func = func
+
+    def render(self):
+        yield f"{self.name} {self.func()}"
+
+
+# Счётчик, который ведёт сам объект (например, Sender.sent): значение только растёт
+class CallbackCounter(Gauge):
+    kind = "counter"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help, func):
+        return self.add(Gauge(name, help, func))
+
+    def counter(self, name, help, func):
+        return self.add(CallbackCounter(name, help, func))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        lines = []
+        for metric in self.metrics:
+            if isinstance(metric, Histogram):
+                lines.extend(metric.summary())
+        return "; ".join(lines)
+
+
+REGISTRY = Registry()
+
+updates_total = REGISTRY.add(Counter("bot_updates_total", "Обработанные апдейты"))
+update_errors_total = REGISTRY.add(Counter("bot_update_errors_total", "Апдейты, завершившиеся ошибкой"))
+update_latency = REGISTRY.add(Histogram("bot_update_latency_seconds", "Время обработки апдейта по состоянию FSM"))
+handler_latency = REGISTRY.add(Histogram("bot_handler_latency_seconds", "Время работы хендлера"))
+api_latency = REGISTRY.add(Histogram("bot_api_latency_seconds", "Время запросов к Telegram API"))
+api_errors_total = REGISTRY.add(Counter("bot_api_errors_total", "Ошибки запросов к Telegram API"))
+throttled_total = REGISTRY.add(Counter("bot_throttled_total", "Апдейты, отброшенные анти-флудом"))
+duplicates_total = REGISTRY.add(Counter("bot_duplicate_submissions_total", "Повторно отправленные одинаковые заявки"))
+db_write_latency = REGISTRY.add(Histogram("bot_db_write_latency_seconds", "Время записи пачки заявок в БД"))
+db_batch_size = REGISTRY.add(Histogram("bot_db_batch_size", "Заявок в одном коммите", buckets=(1, 2, 5, 10, 20, 50, 100)))
+
+
+# Время каждого запроса к Telegram API (подключается к bot.session)
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            api_errors_total.inc(method=name)
+            raise
+        finally:
+            api_latency.observe(time.perf_counter() - started, method=name)
+
+
+async def _handle_metrics(request):
+    return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+
+# HTTP-сервер /metrics и периодическая сводка в лог
+class MetricsServer:
+    def __init__(self, port=METRICS_PORT, host=METRICS_HOST, log_interval=METRICS_LOG_INTERVAL):
+        self.port = port
+        self.host = host
+        self.log_interval = log_interval
+        self._runner = None
+        self._task = None
+
+    async def start(self):
+        if self.port:
+            app = web.Application()
+            app.router.add_get("/metrics", _handle_metrics)
+            self._runner = web.AppRunner(app)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, self.host, self.port).start()
+            logging.info(f"Метрики доступны на {self.host}:{self.port}/metrics")
+        if self.log_interval:
+            self._task = asyncio.create_task(self._log_loop())
+
+    async def _log_loop(self):
+        while True:
+            await asyncio.sleep(self.log_interval)
+            summary = REGISTRY.summary()
+            if summary:
+                logging.info(f"Метрики: {summary}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
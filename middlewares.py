@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+import time
+
+from aiogram import BaseMiddleware, types
+
+from cache import TTLCache
+from fsm_storage import BufferedFSMContext
+from logging_setup import log_context
+from metrics import handler_latency, throttled_total, update_errors_total, update_latency, updates_total
+from sender import TokenBucket
+
+handler_logger = logging.getLogger("handlers")
+
+# Сколько ждём (в секундах) следующее фото альбома, прежде чем считать его полным
+ALBUM_LATENCY = float(os.getenv("ALBUM_LATENCY", "0.6"))
+# Анти-флуд: сколько апдейтов в секунду в среднем и подряд может прислать пользователь (0 — выключен)
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "1"))
+# Запас подряд должен вмещать всю анкету: /start, категория, до 15 фото по одному,
+# «Продолжить» и ответы на вопросы
+THROTTLE_BURST = int(os.getenv("THROTTLE_BURST", "25"))
+# Скольких пользователей помним одновременно
+THROTTLE_USERS = int(os.getenv("THROTTLE_USERS", "10000"))
+
+
+# Собирает сообщения одной медиагруппы и передаёт их в хендлер одним вызовом
+# (параметр album). Остальные сообщения альбома дальше не проходят.
+class AlbumMiddleware(BaseMiddleware):
+    def __init__(self, latency=ALBUM_LATENCY):
+        self.latency = latency
+        self.albums = {}
+
+    async def __call__(self, handler, event: types.Message, data):
+        if not event.media_group_id:
+            return await handler(event, data)
+
+        key = (event.chat.id, event.media_group_id)
+        album = self.albums.get(key)
+        if album is not None:
+            album.append(event)
+            return
+
+        album = self.albums[key] = [event]
+        # Ждём, пока в течение latency не перестанут приходить новые фото
+        while True:
+            count = len(album)
+            await asyncio.sleep(self.latency)
+            if len(album) == count:
+                break
+        del self.albums[key]
+
+        album.sort(key=lambda msg: msg.message_id)
+        data["album"] = album
+        return await handler(album[0], data)
+
+
+# Подменяет FSMContext на буферизованный: внутри апдейта хендлеры могут
+# сколько угодно раз вызывать get_data()/update_data(), а в хранилище
+# уходит одна запись. Апдейты одного ключа FSM обрабатываются по очереди:
+# запись происходит после ответа хендлера, и без блокировки два фото,
+# пришедшие одновременно, перезаписали бы список друг друга.
+# Подключается к message/callback_query после AlbumMiddleware, чтобы
+# ожидание остальных фото альбома не держало блокировку.
+# Состояние читается здесь же, уже под блокировкой, поэтому FSM-мидлварь
+# диспетчера отключена (Dispatcher(disable_fsm=True)): она прочитала бы его
+# ещё раз до блокировки. Ключ и хранилище берутся из неё (dp.fsm).
+class FSMBufferMiddleware(BaseMiddleware):
+    def __init__(self, fsm):
+        self.fsm = fsm
+        # ключ FSM → [блокировка, сколько апдейтов её ждут или держат]
+        self.locks = {}
+
+    async def __call__(self, handler, event, data):
+        data["fsm_storage"] = self.fsm.storage
+        context = self.fsm.resolve_event_context(data["bot"], data)
+        if context is None:
+            return await handler(event, data)
+
+        entry = self.locks.setdefault(context.key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                state = BufferedFSMContext(context.storage, context.key)
+                data["state"] = state
+                data["raw_state"] = await state.load()
+                try:
+                    return await handler(event, data)
+                finally:
+                    await state.flush()
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[context.key]
+
+
+# Заполняет контекст логов (user_id, имя хендлера) и пишет время работы хендлера
+class LogContextMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else None
+        user = data.get("event_from_user")
+        token = log_context.set({"user_id": user.id if user else None, "handler": name})
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            latency = round(time.perf_counter() - started, 4)
+            handler_latency.observe(latency, handler=name)
+            handler_logger.info(f"Хендлер {name} выполнен", extra={"latency": latency})
+            log_context.reset(token)
+
+
+# Счётчики апдейтов и ошибок, время обработки по состоянию FSM.
+# Подключается к message/callback_query первой: состояние читает
+# FSMBufferMiddleware, и к концу обработки оно уже лежит в data.
+class MetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        event_type = data["event_update"].event_type
+        started = time.perf_counter()
+        updates_total.inc(type=event_type)
+        try:
+            return await handler(event, data)
+        except Exception:
+            update_errors_total.inc(type=event_type, state=data.get("raw_state") or "none")
+            raise
+        finally:
+            update_latency.observe(time.perf_counter() - started, state=data.get("raw_state") or "none")
+
+
+# Лимит одного пользователя; warned — какие предупреждения уже отправлены
+class _UserLimit:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.warned = set()
+
+
+# Анти-флуд: у каждого пользователя своё ведро токенов. Апдейты сверх лимита
+# не доходят до хендлера (ни FSM, ни ответов), пользователь один раз получает
+# предупреждение, а про непринятые фото — отдельное, чтобы прислал их заново. Вёдра хранятся в TTLCache: ведро, к которому не обращались
+# burst / rate секунд, снова полное, и его можно забыть.
+class ThrottleMiddleware(BaseMiddleware):
+    def __init__(self, text, photo_text, rate=THROTTLE_RATE, burst=THROTTLE_BURST, size=THROTTLE_USERS, exempt=()):
+        self.text = text
+        self.photo_text = photo_text
+        self.rate = rate
+        self.burst = burst
+        self.exempt = set(exempt)
+        self.limits = TTLCache(burst / rate if rate else 0, size)
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if not self.rate or user is None or user.id in self.exempt:
+            return await handler(event, data)
+
+        limit = self.limits.get(user.id)
+        if limit is None:
+            limit = _UserLimit(TokenBucket(self.rate, self.burst))
+        self.limits.put(user.id, limit)
+
+        if limit.bucket.try_acquire():
+            limit.warned.clear()
+            return await handler(event, data)
+
+        throttled_total.inc(type=type(event).__name__)
+        text = self.photo_text if getattr(event, "photo", None) else self.text
+        if text not in limit.warned:
+            limit.warned.add(text)
+            await event.answer(text)
@@ -0,0 +1,156 @@
+import ast
+import json
+import logging
+from datetime import datetime
+
+# Версия схемы хранится в PRAGMA user_version.
+# Каждая миграция — функция от соединения; дописываются только в конец списка.
+
+# Сколько строк обрабатывается за один коммит при переносе данных
+BACKFILL_BATCH = 500
+
+LEGACY_TIMESTAMP_FORMAT = "%d.%m.%Y %H:%M"
+
+
+# Разбор старых форматов: info = str(dict), photos = "id1,id2", timestamp = "31.12.2024 18:00"
+def parse_legacy_info(raw):
+    if not raw:
+        return {}
+    try:
+        value = ast.literal_eval(raw)
+    except (ValueError, SyntaxError):
+        return {"Текст": raw}
+    return value if isinstance(value, dict) else {"Текст": raw}
+
+
+def parse_legacy_photos(raw):
+    return [file_id for file_id in raw.split(",") if file_id] if raw else []
+
+
+def parse_legacy_timestamp(raw):
+    if not raw:
+        return None
+    try:
+        return int(datetime.strptime(raw, LEGACY_TIMESTAMP_FORMAT).timestamp())
+    except ValueError:
+        return None
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+# 1: исходная таблица заявок
+def _create_applications(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS applications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            username TEXT,
+            full_name TEXT,
+            category TEXT,
+            photos TEXT,
+            info TEXT,
+            timestamp TEXT
+        )
+    ''')
+
+
+# 2: типизированные колонки, отдельная таблица фото и индексы.
+# Старые колонки photos/info/timestamp остаются только у старых строк.
+def _typed_columns(conn):
+    columns = _columns(conn, "applications")
+    if "created_at" not in columns:
+        conn.execute("ALTER TABLE applications ADD COLUMN created_at INTEGER")
+    if "info_json" not in columns:
+        conn.execute("ALTER TABLE applications ADD COLUMN info_json TEXT")
+    if "status" not in columns:
+        conn.execute("ALTER TABLE applications ADD COLUMN status TEXT NOT NULL DEFAULT 'new'")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS application_photos (
+            application_id INTEGER NOT NULL REFERENCES applications(id),
+            position INTEGER NOT NULL,
+            file_id TEXT NOT NULL,
+            PRIMARY KEY (application_id, position)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_applications_user ON applications (user_id, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_applications_category ON applications (category, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_applications_created ON applications (created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_applications_status ON applications (status, id)")
+    conn.commit()
+
+    # Перенос старых строк пачками по id, без загрузки всей таблицы в память.
+    # Если процесс прервётся, следующий запуск продолжит с необработанных строк.
+    last_id = 0
+    migrated = 0
+    while True:
+        rows = conn.execute('''
+            SELECT id, photos, info, timestamp FROM applications
+            WHERE id > ? AND info_json IS NULL
+            ORDER BY id LIMIT ?
+        ''', (last_id, BACKFILL_BATCH)).fetchall()
+        if not rows:
+            break
+        with conn:
+            for app_id, photos, info, timestamp in rows:
+                conn.execute(
+                    "UPDATE applications SET created_at = ?, info_json = ? WHERE id = ?",
+                    (parse_legacy_timestamp(timestamp),
+                     json.dumps(parse_legacy_info(info), ensure_ascii=False), app_id)
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO application_photos (application_id, position, file_id) VALUES (?, ?, ?)",
+                    [(app_id, position, file_id) for position, file_id in enumerate(parse_legacy_photos(photos))]
+                )
+        last_id = rows[-1][0]
+        migrated += len(rows)
+    if migrated:
+        logging.info(f"Миграция: перенесено заявок — {migrated}")
+
+
+# 3: назначение заявок экспертам (статусы new → assigned → claimed → answered)
+def _expert_assignment(conn):
+    columns = _columns(conn, "applications")
+    if "expert_id" not in columns:
+        conn.execute("ALTER TABLE applications ADD COLUMN expert_id INTEGER")
+    if "assigned_at" not in columns:
+        conn.execute("ALTER TABLE applications ADD COLUMN assigned_at INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_applications_expert ON applications (expert_id, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_applications_assigned ON applications (status, assigned_at)")
+
+
+# 4: локальный архив фото (контент-адресное хранилище по sha256)
+def _photo_archive(conn):
+    columns = _columns(conn, "application_photos")
+    for column, kind in (
+        ("sha256", "TEXT"),
+        ("path", "TEXT"),
+        ("thumb_path", "TEXT"),
+        ("archived_at", "INTEGER"),
+        ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+    ):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE application_photos ADD COLUMN {column} {kind}")
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_photos_pending ON application_photos (application_id, position)
+        WHERE archived_at IS NULL
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_photos_sha256 ON application_photos (sha256)")
+
+
+MIGRATIONS = [
+    _create_applications,
+    _typed_columns,
+    _expert_assignment,
+    _photo_archive,
+]
+
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        logging.info(f"Миграция БД до версии {number}")
+        migration(conn)
+        conn.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
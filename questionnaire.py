@@ -0,0 +1,140 @@
+import hashlib
+import json
+
+from aiogram.fsm.state import State, StatesGroup
+
+
+# Состояния пользователя
+class Form(StatesGroup):
+    category = State()
+    photos = State()
+    info = State()
+    technique = State()
+    size = State()
+    material_weight = State()
+    country_year = State()
+    book_info = State()
+    detailed_info = State()
+
+
+# Поля анкеты: в каком состоянии задаётся вопрос и как поле подписано в заявке.
+# Порядок полей — порядок строк в заявке для эксперта.
+FIELDS = {
+    "country_year": (Form.country_year, "Страна и год"),
+    "technique": (Form.technique, "Техника"),
+    "size": (Form.size, "Размер"),
+    "detailed_info": (Form.detailed_info, "Подробно"),
+    "material_weight": (Form.material_weight, "Материал и вес"),
+    "book_info": (Form.book_info, "Книга"),
+    "additional_info": (Form.info, "Дополнительно"),
+}
+
+# Категории: подсказка для фото и вопросы по порядку (поле, текст вопроса).
+# Новая категория — новая запись здесь, код хендлеров не меняется.
+CATEGORIES = {
+    "Автографы": {
+        "photo_prompt": "Сфотографируй общий вид предмета и отдельно крупно сам автограф.",
+        "steps": [
+            ("additional_info", "Расскажи всё, что знаешь о предмете (страна, год, автор, состояние и т.д.)."),
+        ],
+    },
+    "Боны": {
+        "photo_prompt": "Сфотографируй бону с двух сторон.",
+        "steps": [
+            ("country_year", "Укажи страну и год выпуска, если знаешь."),
+            ("additional_info", "Есть ещё какая-то информация о боне?"),
+        ],
+    },
+    "Декоративно-прикладное искусство": {
+        "photo_prompt": "Сфотографируй предмет со всех сторон, снизу, клеймо или подпись (если есть) и все дефекты.",
+        "steps": [
+            ("size", "Какой размер предмета и из какого материала он сделан?"),
+            ("additional_info", "Есть ещё какая-то информация о предмете?"),
+        ],
+    },
+    "Живопись": {
+        "photo_prompt": "Сделай общее фото картины, фото обратной стороны и крупно подпись (если она есть).",
+        "steps": [
+            ("technique", "Какая техника исполнения (масло, акварель, гуашь и т.д.)?"),
+            ("size", "Какой размер картины (в сантиметрах)?"),
+            ("detailed_info", "Расскажи подробнее: страна, автор, происхождение, другая известная информация."),
+        ],
+    },
+    "Книги": {
+        "photo_prompt": "Сделай общие фото книги, титульный лист, страницы с надписями и дефектами.",
+        "steps": [
+            ("book_info", "Название книги, автор и год издания?"),
+        ],
+    },
+    "Марки": {
+        "photo_prompt": "Сфотографируй марки крупно с двух сторон. Если они в альбоме — пришли фото страниц.",
+        "steps": [
+            ("additional_info", "Расскажи всё, что знаешь о предмете (страна, год, автор, состояние и т.д.)."),
+        ],
+    },
+    "Медали": {
+        "photo_prompt": "Сфотографируй медаль с двух сторон.",
+        "steps": [
+            ("additional_info", "Расскажи всё, что знаешь о предмете (страна, год, автор, состояние и т.д.)."),
+        ],
+    },
+    "Монеты": {
+        "photo_prompt": "Сфотографируй монету с двух сторон и отдельно ребро (если там есть надписи).",
+        "steps": [
+            ("material_weight", "Из какого материала монета и какой вес (если знаешь)?"),
+            ("additional_info", "Есть ещё какая-то информация о монете?"),
+        ],
+    },
+    "Открытки": {
+        "photo_prompt": "Сфотографируй открытку с двух сторон.",
+        "steps": [
+            ("additional_info", "Расскажи всё, что знаешь о предмете (страна, год, автор, состояние и т.д.)."),
+        ],
+    },
+    "Фотографии": {
+        "photo_prompt": "Сфотографируй фотографию с двух сторон.",
+        "steps": [
+            ("additional_info", "Расскажи всё, что знаешь о предмете (страна, год, автор, состояние и т.д.)."),
+        ],
+    },
+}
+
+# Промпты для фото
+PHOTO_PROMPTS = {category: config["photo_prompt"] for category, config in CATEGORIES.items()}
+
+
+# Собирает таблицу переходов один раз при старте:
+#   FIRST_STEP[категория] = (состояние, вопрос)
+#   TRANSITIONS[(категория, состояние)] = (поле, (следующее состояние, вопрос) или None)
+def compile_flows(categories):
+    first_step = {}
+    transitions = {}
+    for category, config in categories.items():
+        steps = config["steps"]
+        if not steps:
+            raise ValueError(f"У категории «{category}» нет вопросов")
+        nodes = [(FIELDS[field][0].state, prompt) for field, prompt in steps]
+        first_step[category] = nodes[0]
+        for i, (field, _) in enumerate(steps):
+            key = (category, nodes[i][0])
+            if key in transitions:
+                raise ValueError(f"Состояние {key[1]} дважды встречается в категории «{category}»")
+            transitions[key] = (field, nodes[i + 1] if i + 1 < len(nodes) else None)
+    return first_step, transitions
+
+
+FIRST_STEP, TRANSITIONS = compile_flows(CATEGORIES)
+QUESTION_STATES = sorted({state for _, state in TRANSITIONS})
+
+
+# Ответы анкеты в виде {подпись: ответ} для заявки
+def build_info(data):
+    return {label: data[field] for field, (_, label) in FIELDS.items() if field in data}
+
+
+# Отпечаток заявки для поиска повторов: автор, категория, фото (file_unique_id
+# не зависит от того, как фото переслали) и ответы
+def submission_digest(user_id, data):
+    photos = sorted(data.get("photo_uids") or data.get("photos", []))
+    payload = json.dumps([user_id, data.get("category"), photos, build_info(data)], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import SendMediaGroup
+
+# Лимиты Telegram: ~30 сообщений в секунду всего, ~1 в секунду в личный чат
+# и ~20 в минуту в группу
+GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", "3"))
+GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", str(20 / 60)))
+# Сколько попыток даём одному сообщению и максимальная пауза между ними
+SEND_MAX_ATTEMPTS = int(os.getenv("SEND_MAX_ATTEMPTS", "5"))
+SEND_MAX_BACKOFF = float(os.getenv("SEND_MAX_BACKOFF", "30"))
+# Сколько очередей отдельных чатов держим в памяти
+MAX_LANES = 10000
+
+
+# Классическое «ведро с токенами»: rate токенов в секунду, не больше capacity
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Без ожидания: True, если токены были и списаны
+    def try_acquire(self, cost=1):
+        self._refill()
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    async def acquire(self, cost=1):
+        cost = min(cost, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= cost:
+                self.tokens -= cost
+                return
+            await asyncio.sleep((cost - self.tokens) / self.rate)
+
+
+# Очередь одного чата: сообщения уходят строго по порядку
+class _Lane:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.jobs = deque()
+        self.task = None
+
+
+# Центральная очередь исходящих сообщений.
+# Соблюдает лимиты Telegram, выполняет retry_after и повторяет запрос
+# при сетевых ошибках. Хендлеры ставят сообщение в очередь и не ждут отправки.
+class Sender:
+    def __init__(self, bot):
+        self.bot = bot
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self.lanes = OrderedDict()
+        self.pending = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.latencies = deque(maxlen=1000)
+
+    def _lane(self, chat_id):
+        lane = self.lanes.get(chat_id)
+        if lane is None:
+            if chat_id is not None and int(chat_id) < 0:
+                bucket = TokenBucket(GROUP_RATE, CHAT_BURST)
+            else:
+                bucket = TokenBucket(CHAT_RATE, CHAT_BURST)
+            lane = self.lanes[chat_id] = _Lane(bucket)
+            self._evict_idle_lanes()
+        else:
+            self.lanes.move_to_end(chat_id)
+        return lane
+
+    def _evict_idle_lanes(self):
+        for chat_id in list(self.lanes):
+            if len(self.lanes) <= MAX_LANES:
+                break
+            lane = self.lanes[chat_id]
+            if lane.task is None and not lane.jobs:
+                del self.lanes[chat_id]
+
+    # Ставит метод API (SendMessage, SendMediaGroup, ...) в очередь.
+    # Возвращает future с результатом — его можно дождаться, а можно и нет.
+    def submit(self, method, description=""):
+        chat_id = getattr(method, "chat_id", None)
+        future = asyncio.get_running_loop().create_future()
+        # Ошибка уже залогирована, даже если future никто не ждёт
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        lane = self._lane(chat_id)
+        lane.jobs.append((method, description, future, time.monotonic()))
+        self.pending += 1
+        if lane.task is None:
+            lane.task = asyncio.create_task(self._drain(lane))
+        return future
+
+    async def send(self, method, description=""):
+        return await self.submit(method, description)
+
+    async def _drain(self, lane):
+        try:
+            while lane.jobs:
+                method, description, future, queued_at = lane.jobs.popleft()
+                try:
+                    result = await self._execute(lane, method, description)
+                except Exception as e:
+                    self.failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.sent += 1
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self.pending -= 1
+                    self.latencies.append(time.monotonic() - queued_at)
+        finally:
+            lane.task = None
+
+    async def _execute(self, lane, method, description):
+        cost = len(method.media) if isinstance(method, SendMediaGroup) else 1
+        name = type(method).__name__
+        for attempt in range(1, SEND_MAX_ATTEMPTS + 1):
+            await lane.bucket.acquire(cost)
+            await self.global_bucket.acquire(cost)
+            try:
+                return await self.bot(method)
+            except TelegramRetryAfter as e:
+                error, delay = e, e.retry_after
+            except (TelegramNetworkError, TelegramServerError) as e:
+                error, delay = e, min(SEND_MAX_BACKOFF, 2 ** (attempt - 1))
+            except Exception as e:
+                logging.error(f"Ошибка отправки {name} ({description}): {e}")
+                raise
+            if attempt == SEND_MAX_ATTEMPTS:
+                logging.error(f"Не удалось отправить {name} ({description}) после {attempt} попыток: {error}")
+                raise error
+            self.retries += 1
+            logging.warning(f"Повтор {name} ({description}) через {delay} с, попытка {attempt}")
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        if latencies:
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        else:
+            p50 = p95 = 0.0
+        return {
+            "queue_depth": self.pending,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "latency_p50": p50,
+            "latency_p95": p95,
+        }
+
+    # Дожидается отправки всего, что уже стоит в очереди
+    async def stop(self):
+        tasks = [lane.task for lane in self.lanes.values() if lane.task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
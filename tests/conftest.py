@@ -0,0 +1,50 @@
+import contextlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Модули читают настройки при импорте, а тесты импортируют их ещё при сборе:
+# окружение задаём до этого. Лимиты отправки и анти-флуд снимаем
+os.environ.update(
+    API_TOKEN="1:test",
+    EXPERT_IDS="900001",
+    FSM_STORAGE="memory",
+    METRICS_PORT="0",
+    METRICS_LOG_INTERVAL="0",
+    ARCHIVE_DIR="",
+    THROTTLE_RATE="0",
+    SEND_GLOBAL_RATE="1000000",
+    SEND_CHAT_RATE="1000000",
+    SEND_GROUP_RATE="1000000",
+)
+
+
+# Модуль bot импортируем один раз, во временной папке и без сети
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("bot")
+    os.environ["LOG_FILE"] = str(workdir / "bot.log")
+    os.chdir(workdir)
+    import bot
+    return bot
+
+
+# Хранилище заявок во временной папке. Оно привязано к event loop, поэтому
+# запускается внутри теста: async with repo() as apps
+@pytest.fixture
+def repo(tmp_path):
+    from db import ApplicationRepository
+
+    @contextlib.asynccontextmanager
+    async def started():
+        apps = ApplicationRepository(str(tmp_path / "apps.db"))
+        await apps.start()
+        try:
+            yield apps
+        finally:
+            await apps.stop()
+    return started
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from experts import ExpertPool, check_experts
+
+
+async def _stale_application(repo, expert_id, status):
+    app_id = await repo.save_application(1, "user", "User", "Монеты", ["f1"], {})
+    await repo.assign(app_id, expert_id)
+
+    def expire():
+        with repo._conn:
+            repo._conn.execute("UPDATE applications SET status = ?, assigned_at = 0 WHERE id = ?", (status, app_id))
+    await repo.run(expire)
+    return app_id
+
+
+def _pool(repo, expert_ids, calls):
+    pool = ExpertPool(repo, expert_ids, claim_timeout=60)
+
+    async def reassign(expert_id, app_id):
+        calls.append(("reassign", expert_id, app_id))
+
+    async def remind(expert_id, app_id):
+        calls.append(("remind", expert_id, app_id))
+
+    pool.on_reassign = reassign
+    pool.on_remind = remind
+    return pool
+
+
+# Единственный эксперт: заявка не пересылается ему же, а взятая в работу
+# не возвращается в assigned; напоминание — одно за CLAIM_TIMEOUT
+def test_single_expert_gets_reminder_not_resend(repo):
+    async def run():
+        async with repo() as apps:
+            calls = []
+            pool = _pool(apps, [777], calls)
+            app_id = await _stale_application(apps, 777, "claimed")
+            for _ in range(3):
+                await pool.reassign_stale()
+
+            app = await apps.get_application(app_id)
+            assert calls == [("remind", 777, app_id)]
+            assert app["status"] == "claimed"
+            assert app["expert_id"] == 777
+
+    asyncio.run(run())
+
+
+def test_stale_application_moves_to_another_expert(repo):
+    async def run():
+        async with repo() as apps:
+            calls = []
+            pool = _pool(apps, [777, 888], calls)
+            app_id = await _stale_application(apps, 777, "claimed")
+            await pool.reassign_stale()
+
+            app = await apps.get_application(app_id)
+            assert calls == [("reassign", 888, app_id)]
+            assert (app["status"], app["expert_id"]) == ("assigned", 888)
+
+    asyncio.run(run())
+
+
+# Пустой пул экспертов останавливает запуск, а не падает на первой заявке
+@pytest.mark.parametrize("expert_ids, categories", [([], {}), ([777], {"Монеты": []})])
+def test_empty_expert_pool_is_rejected(expert_ids, categories):
+    with pytest.raises(SystemExit):
+        check_experts(expert_ids, categories)
+
+
+# После переназначения прежний эксперт не может ответить: оценку даёт только новый
+def test_previous_expert_cannot_answer_reassigned_application(repo):
+    async def run():
+        async with repo() as apps:
+            pool = _pool(apps, [777, 888], [])
+            app_id = await _stale_application(apps, 777, "claimed")
+            await pool.reassign_stale()
+
+            assert not await apps.answer(app_id, 777)
+            assert await apps.claim(app_id, 888, pool.claim_timeout) == 1
+            assert await apps.answer(app_id, 888)
+            assert not await apps.answer(app_id, 888)
+
+    asyncio.run(run())
@@ -0,0 +1,81 @@
+import asyncio
+import itertools
+import time
+from types import SimpleNamespace
+
+import pytest
+from aiogram import types
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bench import make_session
+from fsm_storage import SQLiteStorage
+
+USER_ID = 100001
+ids = itertools.count(1)
+
+
+def message(**fields):
+    payload = dict(
+        message_id=next(ids), date=int(time.time()),
+        chat=dict(id=USER_ID, type="private"),
+        from_user=dict(id=USER_ID, is_bot=False, first_name="Test"),
+    )
+    payload.update(fields)
+    return types.Update(update_id=next(ids), message=payload)
+
+
+def photo():
+    unique = next(ids)
+    return message(photo=[dict(file_id=f"f{unique}", file_unique_id=f"u{unique}", width=800, height=600)])
+
+
+# Одновременные фото одного пользователя: каждое должно попасть в заявку,
+# хотя ответ хендлера (с задержкой API) уходит раньше записи в FSM
+@pytest.mark.parametrize("storage", ["memory", "sqlite"])
+def test_concurrent_photos_are_not_lost(app, storage, tmp_path, monkeypatch):
+    async def run():
+        app.bot.session = make_session(SimpleNamespace(api_latency=50))
+        monkeypatch.setattr(
+            app.dp.fsm, "storage", MemoryStorage() if storage == "memory" else SQLiteStorage(str(tmp_path / "fsm.db"))
+        )
+        try:
+            await app.dp.feed_update(app.bot, message(text="/start"))
+            await app.dp.feed_update(app.bot, message(text="Монеты"))
+            await asyncio.gather(*[app.dp.feed_update(app.bot, photo()) for _ in range(5)])
+
+            key = StorageKey(bot_id=app.bot.id, chat_id=USER_ID, user_id=USER_ID)
+            data = await app.dp.fsm.storage.get_data(key)
+            assert len(data["photos"]) == 5
+            assert len(set(data["photo_uids"])) == 5
+        finally:
+            await app.dp.fsm.storage.close()
+
+    asyncio.run(run())
+
+
+# SQLite: на апдейт с фото — одно чтение строки FSM и одна запись
+def test_one_storage_read_and_write_per_update(app, tmp_path, monkeypatch):
+    class CountingStorage(SQLiteStorage):
+        def __init__(self, db_file):
+            super().__init__(db_file)
+            self.calls = []
+
+        async def _run(self, func, *args):
+            self.calls.append(func.__name__)
+            return await super()._run(func, *args)
+
+    async def run():
+        app.bot.session = make_session(SimpleNamespace(api_latency=0))
+        storage = CountingStorage(str(tmp_path / "fsm.db"))
+        monkeypatch.setattr(app.dp.fsm, "storage", storage)
+        try:
+            await app.dp.feed_update(app.bot, message(text="/start"))
+            await app.dp.feed_update(app.bot, message(text="Монеты"))
+            storage.calls.clear()
+            await app.dp.feed_update(app.bot, photo())
+            assert storage.calls == ["_fetch_record", "_store_record"]
+        finally:
+            await storage.close()
+
+    asyncio.run(run())
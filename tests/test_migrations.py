@@ -0,0 +1,93 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import migrations
+from migrations import BACKFILL_BATCH, LEGACY_TIMESTAMP_FORMAT, MIGRATIONS, migrate
+
+ROWS = BACKFILL_BATCH * 2 + 7
+START = datetime(2024, 12, 31, 18, 0)
+
+
+def legacy_info(i):
+    return {"Дополнительно": f"ответ {i}", "Размер": "10×15"} if i % 5 else {}
+
+
+# Строка в том виде, как её писал исходный save_application:
+# info = str(dict), photos = "id1,id2", timestamp = "31.12.2024 18:00"
+def legacy_row(i):
+    photos = [f"p{i}_{n}" for n in range(i % 3)]
+    timestamp = (START + timedelta(minutes=i)).strftime(LEGACY_TIMESTAMP_FORMAT)
+    return i, f"user{i}", "User", "Монеты", ",".join(photos), str(legacy_info(i)), timestamp
+
+
+def baseline_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS applications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            username TEXT,
+            full_name TEXT,
+            category TEXT,
+            photos TEXT,
+            info TEXT,
+            timestamp TEXT
+        )
+    ''')
+    conn.executemany('''
+        INSERT INTO applications (user_id, username, full_name, category, photos, info, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [legacy_row(i) for i in range(1, ROWS + 1)])
+    conn.commit()
+    return conn
+
+
+def assert_backfilled(conn):
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    rows = conn.execute("SELECT id, created_at, info_json FROM applications ORDER BY id").fetchall()
+    assert len(rows) == ROWS
+    photos = {}
+    for app_id, position, file_id in conn.execute(
+        "SELECT application_id, position, file_id FROM application_photos ORDER BY application_id, position"
+    ):
+        photos.setdefault(app_id, []).append((position, file_id))
+
+    for app_id, created_at, info_json in rows:
+        _, _, _, _, raw_photos, _, timestamp = legacy_row(app_id)
+        assert json.loads(info_json) == legacy_info(app_id)
+        assert created_at == int(datetime.strptime(timestamp, LEGACY_TIMESTAMP_FORMAT).timestamp())
+        expected = list(enumerate(raw_photos.split(","))) if raw_photos else []
+        assert photos.get(app_id, []) == expected
+
+
+def test_backfill_parses_legacy_rows(tmp_path):
+    conn = baseline_db(str(tmp_path / "apps.db"))
+    migrate(conn)
+    assert_backfilled(conn)
+
+
+# Перенос прервался на второй пачке: первая уже закоммичена, повторный запуск
+# доделывает остальное без дублей фото
+def test_backfill_resumes_after_interruption(tmp_path, monkeypatch):
+    conn = baseline_db(str(tmp_path / "apps.db"))
+    parse = migrations.parse_legacy_timestamp
+    failing = (START + timedelta(minutes=BACKFILL_BATCH + 3)).strftime(LEGACY_TIMESTAMP_FORMAT)
+
+    def interrupted(raw):
+        if raw == failing:
+            raise RuntimeError("прервано")
+        return parse(raw)
+
+    monkeypatch.setattr(migrations, "parse_legacy_timestamp", interrupted)
+    with pytest.raises(RuntimeError):
+        migrate(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 1
+    done = conn.execute("SELECT COUNT(*) FROM applications WHERE info_json IS NOT NULL").fetchone()[0]
+    assert done == BACKFILL_BATCH
+
+    monkeypatch.setattr(migrations, "parse_legacy_timestamp", parse)
+    migrate(conn)
+    assert_backfilled(conn)
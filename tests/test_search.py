@@ -0,0 +1,21 @@
+import asyncio
+
+
+# Поиск по датам: строки внутри диапазона id, но вне периода (без даты
+# или со сдвигом часов), в выдачу не попадают
+def test_date_search_filters_created_at(repo):
+    async def run():
+        async with repo() as apps:
+            ids = [await apps.save_application(1, "user", "User", "Монеты", [], {}) for _ in range(4)]
+
+            def set_dates():
+                with apps._conn:
+                    for app_id, created_at in zip(ids, (1000, None, 5000, 1500)):
+                        apps._conn.execute("UPDATE applications SET created_at = ? WHERE id = ?", (created_at, app_id))
+            await apps.run(set_dates)
+
+            rows, more = await apps.search_applications(since=900, until=2000)
+            assert [row["id"] for row in rows] == [ids[3], ids[0]]
+            assert not more
+
+    asyncio.run(run())
@@ -0,0 +1,47 @@
+import asyncio
+from types import SimpleNamespace
+
+from middlewares import THROTTLE_BURST, ThrottleMiddleware
+
+USER = SimpleNamespace(id=100001)
+
+
+class Event:
+    def __init__(self, photo=None):
+        self.photo = photo
+        self.answers = []
+
+    async def answer(self, text):
+        self.answers.append(text)
+
+
+def _feed(middleware, events):
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event)
+
+    async def run():
+        for event in events:
+            await middleware(handler, event, {"event_from_user": USER})
+
+    asyncio.run(run())
+    return handled
+
+
+# Полная анкета, отправленная разом (15 фото по одному), проходит целиком
+def test_default_burst_fits_full_flow():
+    middleware = ThrottleMiddleware("text", "photo", rate=1, burst=THROTTLE_BURST)
+    flow = [Event(), Event()] + [Event(photo=["p"]) for _ in range(15)] + [Event() for _ in range(4)]
+    assert len(_feed(middleware, flow)) == len(flow)
+
+
+# Отброшенные фото: пользователь узнаёт, что именно фото не приняты, один раз за серию
+def test_dropped_photos_are_reported_once():
+    middleware = ThrottleMiddleware("text", "photo", rate=1, burst=3)
+    events = [Event(photo=["p"]) for _ in range(6)]
+    handled = _feed(middleware, events)
+
+    assert len(handled) == 3
+    answers = [text for event in events for text in event.answers]
+    assert answers == ["photo"]
@@ -0,0 +1,13 @@
+import asyncio
+
+import pytest
+
+import webhook
+
+
+# Публичный вебхук без секрета не запускается: иначе апдейты может прислать кто угодно
+def test_public_webhook_requires_secret(monkeypatch):
+    monkeypatch.setattr(webhook, "WEBHOOK_URL", "https://example.com")
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", None)
+    with pytest.raises(SystemExit):
+        asyncio.run(webhook.run_webhook(dp=None, bot=None))
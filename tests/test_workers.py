@@ -0,0 +1,58 @@
+import asyncio
+import os
+import time
+
+import workers
+
+
+# Рабочий без бота: записывает номера апдейтов в файл. Первый процесс,
+# получив апдейт с hang, зависает навсегда — его убьёт супервизор
+def fake_worker(index, reader, received, heartbeat, env):
+    log = os.environ["TEST_WORKER_LOG"]
+    while True:
+        heartbeat.value = time.time()
+        if not reader.poll(0.1):
+            continue
+        received.value, update = reader.recv()
+        if update is None:
+            return
+        if update.get("hang") and not os.path.exists(f"{log}.hung"):
+            open(f"{log}.hung", "w").close()
+            time.sleep(3600)
+        with open(log, "a") as f:
+            f.write(f"{update['update_id']}\n")
+
+
+def _processed(log):
+    if not os.path.exists(log):
+        return []
+    with open(log) as f:
+        return [int(line) for line in f]
+
+
+# Зависший рабочий перезапускается, и апдейты, которые он не успел получить,
+# по порядку доходят до нового процесса — шард не умирает
+def test_restarted_worker_gets_undelivered_updates(tmp_path, monkeypatch):
+    log = str(tmp_path / "processed.txt")
+    monkeypatch.setenv("TEST_WORKER_LOG", log)
+    monkeypatch.setattr(workers, "worker_main", fake_worker)
+    monkeypatch.setattr(workers, "WORKER_HEARTBEAT_TIMEOUT", 2)
+    expected = [update_id for update_id in range(50) if update_id != 3]
+
+    async def run():
+        supervisor = workers.Supervisor(bot=None, workers=1)
+        supervisor.spawn(0)
+        supervisor.forwarders = [asyncio.create_task(supervisor._forward(0))]
+        for update_id in range(50):
+            await supervisor.dispatch({"update_id": update_id, "message": {"from": {"id": 1}}, "hang": update_id == 3})
+
+        deadline = time.time() + 60
+        while _processed(log) != expected and time.time() < deadline:
+            await asyncio.sleep(0.2)
+            supervisor.check_workers()
+        await supervisor.stop_workers()
+        return supervisor.restarts
+
+    assert asyncio.run(run()) == 1
+    # Апдейт 3 рабочий получил и не обработал, остальные дошли без потерь и по порядку
+    assert _processed(log) == expected
@@ -0,0 +1,98 @@
+from aiogram.types import BotCommand, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
+
+from questionnaire import CATEGORIES
+
+# Клавиатуры и тексты собираются один раз при импорте и переиспользуются
+# всеми хендлерами. Объекты общие — не изменяйте их.
+
+
+def _category_keyboard():
+    names = list(CATEGORIES)
+    buttons = [names[i:i + 2] for i in range(0, len(names), 2)]
+    kb = [[KeyboardButton(text=text) for text in row] for row in buttons]
+    kb.append([KeyboardButton(text="Отмена")])
+    return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True, one_time_keyboard=True)
+
+
+CATEGORY_KEYBOARD = _category_keyboard()
+
+PHOTO_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="Отправить ещё фото"), KeyboardButton(text="Продолжить")],
+        [KeyboardButton(text="Отмена")]
+    ],
+    resize_keyboard=True,
+    one_time_keyboard=False,
+    input_field_placeholder="Пришли фото или нажми кнопку"
+)
+
+CANCEL_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[[KeyboardButton(text="Отмена")]],
+    resize_keyboard=True,
+    one_time_keyboard=True
+)
+
+REMOVE_KEYBOARD = ReplyKeyboardRemove()
+
+# Команды меню
+BOT_COMMANDS = [
+    BotCommand(command="start", description="Начать новую заявку на оценку"),
+    BotCommand(command="cancel", description="Отменить текущую заявку")
+]
+
+# Тексты
+START_TEXT = (
+    "Привет! 😊 Я помогу тебе отправить один предмет на оценку нашему эксперту по антиквариату.\n\n"
+    "Это займёт всего 2–3 минуты, и ты получишь предварительную оценку бесплатно.\n\n"
+    "Для начала выбери категорию предмета:"
+)
+
+# Подсказка для фото по каждой категории — готовый текст
+PHOTO_PROMPT_TEXTS = {
+    category: (
+        "📸 Чтобы эксперт мог дать точную оценку, пришли фото в хорошем качестве "
+        "и при дневном освещении (без вспышки).\n\n" +
+        config["photo_prompt"] +
+        "\n\nПрисылай фото. Когда закончишь — нажми «Продолжить»."
+    )
+    for category, config in CATEGORIES.items()
+}
+
+THANKS_TEXT = (
+    "Спасибо большое! 🙏 Твоя заявка отправлена эксперту.\n"
+    "Он изучит фото и информацию и скоро напишет тебе ответ.\n"
+    "Хорошего дня! ☀️"
+)
+
+DUPLICATE_TEXT = (
+    "Такая заявка уже отправлена эксперту — повторять не нужно 🙂\n"
+    "Ответ придёт сюда, как только эксперт её оценит."
+)
+
+THROTTLE_TEXT = "Слишком много сообщений подряд. Подожди пару секунд и продолжай 🙏"
+
+THROTTLE_PHOTO_TEXT = (
+    "⚠️ Часть фото не принята: слишком много сообщений подряд.\n"
+    "Подожди пару секунд, сверь счётчик «Всего» и пришли недостающие фото ещё раз."
+)
+
+# Шаблоны: подставляются через .format()
+EXPERT_ANSWER_TEMPLATE = (
+    "✉️ <b>Ответ эксперта по вашей заявке №{app_number}</b>\n\n"
+    "🔍 <b>Предварительная оценка:</b>\n"
+    "<i>{summa}</i>\n\n"
+    "📝 Эксперт изучил предоставленные фотографии и информацию.\n"
+    "Это ориентировочная стоимость на текущий момент.\n\n"
+    "Если у вас есть дополнительные вопросы или вы хотите обсудить продажу/покупку — напишите эксперту напрямую.\n\n"
+    "Спасибо, что обратились к нам! 🙏\n"
+    "Желаем удачи с вашим антиквариатом! ✨"
+)
+
+REMINDER_TEMPLATE = "⏰ Заявка №{app_number} всё ещё ждёт вашей оценки."
+
+APPLICATION_TEMPLATE = (
+    "Новая заявка №{app_number}\n\n"
+    "Категория: {category}\n"
+    "Пользователь: {full_name} (@{username})\n"
+    "ID: {user_id}\n\n"
+)
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import os
+import signal
+
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+# Публичный адрес, который регистрируется в Telegram (без него вебхук не ставится —
+# удобно для локальной проверки POST-запросами)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Секрет, который Telegram присылает в заголовке X-Telegram-Bot-Api-Secret-Token.
+# С публичным WEBHOOK_URL обязателен: без него апдейты может прислать кто угодно
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Сколько апдейтов обрабатывается одновременно
+WEBHOOK_MAX_IN_FLIGHT = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", "100"))
+# Сколько ждём (в секундах) завершения хендлеров при остановке
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))
+
+
+# Обработчик вебхука с ограничением числа апдейтов в работе.
+# Когда лимит исчерпан, ответ Telegram задерживается, и он сам притормаживает.
+class BoundedRequestHandler(SimpleRequestHandler):
+    def __init__(self, dispatcher, bot, max_in_flight=WEBHOOK_MAX_IN_FLIGHT, **kwargs):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def _handle_request_background(self, bot, request):
+        update = await request.json(loads=bot.session.json_loads)
+        await self.semaphore.acquire()
+        task = asyncio.create_task(self._background_feed_update(bot=bot, update=update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        task.add_done_callback(lambda _: self.semaphore.release())
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    # Дожидается хендлеров, которые уже в работе. Сессию бота закрываем позже,
+    # после остановки диспетчера, чтобы очередь отправки успела доработать.
+    async def close(self):
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logging.info(f"Ожидание {len(tasks)} апдейтов перед остановкой")
+        done, pending = await asyncio.wait(tasks, timeout=WEBHOOK_DRAIN_TIMEOUT)
+        if pending:
+            logging.warning(f"Не дождались {len(pending)} апдейтов, отменяем")
+            for task in pending:
+                task.cancel()
+
+
+def build_app(dp, bot):
+    app = web.Application()
+    handler = BoundedRequestHandler(dp, bot, secret_token=WEBHOOK_SECRET)
+    # Порядок важен: сначала дожидаемся хендлеров, потом останавливаем диспетчер
+    handler.register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    async def close_session(_):
+        await bot.session.close()
+
+    app.on_cleanup.append(close_session)
+    return app
+
+
+def check_secret():
+    if WEBHOOK_URL and not WEBHOOK_SECRET:
+        raise SystemExit("Для вебхука с WEBHOOK_URL нужен WEBHOOK_SECRET")
+    if not WEBHOOK_SECRET:
+        logging.warning("WEBHOOK_SECRET не задан: вебхук принимает запросы без проверки")
+
+
+async def run_webhook(dp, bot):
+    check_secret()
+    app = build_app(dp, bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types()
+        )
+    logging.info(f"Вебхук слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
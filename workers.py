@@ -0,0 +1,322 @@
+# Запуск в несколько процессов:
+#
+#   WORKERS=4 FSM_STORAGE=sqlite:///fsm.db python workers.py
+#
+# Супервизор один раз получает апдейты (long polling) и раздаёт их рабочим
+# процессам. Апдейты одного пользователя всегда попадают в один и тот же процесс,
+# поэтому порядок и состояние анкеты не ломаются. Состояние FSM и заявки рабочие
+# делят через внешнее хранилище (FSM_STORAGE) и общую БД. Упавший или зависший
+# рабочий перезапускается с новым каналом, и апдейты, которые не дошли до
+# прежнего процесса, по порядку получает новый.
+import asyncio
+import collections
+import contextlib
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WORKERS = int(os.getenv("WORKERS", str(os.cpu_count() or 2)))
+# Сколько апдейтов может ждать в очереди одного рабочего
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))
+# Сколько апдейтов рабочий обрабатывает одновременно
+WORKER_MAX_IN_FLIGHT = int(os.getenv("WORKER_MAX_IN_FLIGHT", "100"))
+# Рабочий без признаков жизни дольше этого (в секундах) считается зависшим
+WORKER_HEARTBEAT_TIMEOUT = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", "30"))
+WORKER_HEALTH_INTERVAL = float(os.getenv("WORKER_HEALTH_INTERVAL", "5"))
+# Сколько ждём (в секундах) рабочих при остановке
+WORKER_STOP_TIMEOUT = float(os.getenv("WORKER_STOP_TIMEOUT", "30"))
+
+# Какие апдейты обрабатывает бот
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+# Метка в очереди рабочего: его перезапустили, пора переслать недоставленное
+_RESTARTED = object()
+
+
+# Номер рабочего для апдейта: по пользователю, а если его нет — по чату
+def shard_for(update, workers):
+    for key, payload in update.items():
+        if not isinstance(payload, dict):
+            continue
+        user = payload.get("from") or payload.get("user")
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        target = user or chat
+        if target and "id" in target:
+            return int(target["id"]) % workers
+    return 0
+
+
+# Переменные окружения рабочего: свои лог-файл и порт метрик,
+# лимиты отправки делятся между процессами
+def worker_env(index, workers):
+    env = {"WORKER_INDEX": str(index), "WORKERS": str(workers)}
+
+    base, ext = os.path.splitext(os.getenv("LOG_FILE", "bot.log"))
+    env["LOG_FILE"] = f"{base}.{index}{ext}"
+
+    metrics_port = int(os.getenv("METRICS_PORT", "0"))
+    if metrics_port:
+        env["METRICS_PORT"] = str(metrics_port + index)
+
+    for name, default in (("SEND_GLOBAL_RATE", 30), ("SEND_CHAT_RATE", 1), ("SEND_GROUP_RATE", 20 / 60)):
+        env[name] = str(float(os.getenv(name, str(default))) / workers)
+    return env
+
+
+def worker_main(index, reader, received, heartbeat, env):
+    os.environ.update(env)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker(reader, received, heartbeat))
+
+
+# Пульс рабочего отдельной задачей: показывает, что жив event loop, даже если
+# все WORKER_MAX_IN_FLIGHT апдейтов ещё обрабатываются и новые не читаются
+async def _heartbeat(heartbeat):
+    while True:
+        heartbeat.value = time.time()
+        await asyncio.sleep(1)
+
+
+# Апдейты приходят парами (номер, апдейт); номер последнего полученного
+# рабочий сообщает супервизору через received. Апдейт None — сигнал остановки.
+async def _worker(reader, received, heartbeat):
+    import bot as app
+
+    pulse = asyncio.create_task(_heartbeat(heartbeat))
+    await app.dp.emit_startup(bot=app.bot, dispatcher=app.dp)
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(WORKER_MAX_IN_FLIGHT)
+    tasks = set()
+
+    # Ошибки хендлеров aiogram уже залогировал, здесь их только забираем
+    def done(task):
+        tasks.discard(task)
+        semaphore.release()
+        if not task.cancelled():
+            task.exception()
+
+    try:
+        while True:
+            if not await loop.run_in_executor(None, reader.poll, 1.0):
+                continue
+            received.value, update = await loop.run_in_executor(None, reader.recv)
+            if update is None:
+                break
+            await semaphore.acquire()
+            task = asyncio.create_task(app.dp.feed_raw_update(app.bot, update))
+            tasks.add(task)
+            task.add_done_callback(done)
+    finally:
+        if tasks:
+            await asyncio.wait(tasks, timeout=WORKER_STOP_TIMEOUT)
+        await app.dp.emit_shutdown(bot=app.bot, dispatcher=app.dp)
+        await app.bot.session.close()
+        pulse.cancel()
+
+
+# Канал к одному процессу рабочего. У pipe один читатель и нет общих
+# блокировок, поэтому убитый посреди чтения рабочий не запирает канал;
+# при перезапуске создаётся новый канал, старый не переиспользуется.
+class _Channel:
+    def __init__(self, context):
+        self.reader, self.writer = context.Pipe(duplex=False)
+
+
+class Supervisor:
+    def __init__(self, bot, workers=WORKERS):
+        self.bot = bot
+        self.workers = workers
+        self.context = multiprocessing.get_context("spawn")
+        # Очередь апдейтов рабочего живёт в супервизоре и переживает его перезапуск
+        self.backlogs = [asyncio.Queue(maxsize=WORKER_QUEUE_SIZE) for _ in range(workers)]
+        # Отправленные рабочему, но ещё не полученные им апдейты
+        self.unacked = [collections.deque() for _ in range(workers)]
+        # Общие значения без блокировок: убитый процесс не оставит их запертыми
+        self.received = [self.context.Value("q", 0, lock=False) for _ in range(workers)]
+        self.heartbeats = [self.context.Value("d", 0.0, lock=False) for _ in range(workers)]
+        self.channels = [None] * workers
+        self.processes = [None] * workers
+        self.forwarders = []
+        self.sequence = 0
+        self.restarts = 0
+
+    def spawn(self, index):
+        channel = _Channel(self.context)
+        self.heartbeats[index].value = time.time()
+        process = self.context.Process(
+            target=worker_main,
+            args=(index, channel.reader, self.received[index], self.heartbeats[index],
+                  worker_env(index, self.workers)),
+            name=f"bot-worker-{index}",
+            daemon=False,
+        )
+        process.start()
+        self.channels[index] = channel
+        self.processes[index] = process
+        logging.info(f"Рабочий {index} запущен, pid {process.pid}")
+
+    # Проверка здоровья: перезапуск упавших и зависших рабочих
+    def check_workers(self):
+        now = time.time()
+        for index, process in enumerate(self.processes):
+            if not process.is_alive():
+                logging.error(f"Рабочий {index} завершился с кодом {process.exitcode}, перезапуск")
+            elif now - self.heartbeats[index].value > WORKER_HEARTBEAT_TIMEOUT:
+                logging.error(f"Рабочий {index} не отвечает, перезапуск")
+                process.kill()
+                process.join()
+            else:
+                continue
+            # Без читателя зависшая отправка в старый канал сразу завершится ошибкой
+            self.channels[index].reader.close()
+            self.restarts += 1
+            self.spawn(index)
+            with contextlib.suppress(asyncio.QueueFull):
+                self.backlogs[index].put_nowait(_RESTARTED)
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(WORKER_HEALTH_INTERVAL)
+            self.check_workers()
+
+    async def dispatch(self, update):
+        # Если очередь рабочего полна — ждём, тем самым притормаживая polling
+        await self.backlogs[shard_for(update, self.workers)].put(update)
+
+    # Пересылка апдейтов из очереди рабочему. Апдейт хранится в unacked, пока
+    # рабочий не сообщит, что получил его. Если рабочего перезапустили, новому
+    # сначала уходит всё, что не получил прежний, и только потом следующие.
+    async def _forward(self, index):
+        loop = asyncio.get_running_loop()
+        backlog, unacked = self.backlogs[index], self.unacked[index]
+        channel = self.channels[index]
+        while True:
+            update = await backlog.get()
+            self._drop_received(index)
+            if update is _RESTARTED:
+                pending = []
+            else:
+                self.sequence += 1
+                unacked.append((self.sequence, update))
+                pending = [unacked[-1]]
+            while True:
+                if channel is not self.channels[index]:
+                    channel.writer.close()
+                    channel = self.channels[index]
+                    self._drop_received(index)
+                    pending = list(unacked)
+                    if pending:
+                        logging.warning(f"Рабочему {index} повторно отправлено апдейтов: {len(pending)}")
+                try:
+                    for message in pending:
+                        await loop.run_in_executor(None, channel.writer.send, message)
+                    break
+                except OSError as e:
+                    # Обычно канал закрыт при перезапуске, и новый уже готов
+                    if channel is self.channels[index]:
+                        logging.error(f"Ошибка отправки апдейта рабочему {index}: {e}")
+                        await asyncio.sleep(1)
+            if update is None:
+                return
+
+    def _drop_received(self, index):
+        unacked, received = self.unacked[index], self.received[index].value
+        while unacked and unacked[0][0] <= received:
+            unacked.popleft()
+
+    async def _poll(self):
+        offset = None
+        while True:
+            try:
+                updates = await self.bot.get_updates(offset=offset, timeout=30, allowed_updates=ALLOWED_UPDATES)
+            except Exception as e:
+                logging.error(f"Ошибка получения апдейтов: {e}")
+                await asyncio.sleep(5)
+                continue
+            for update in updates:
+                await self.dispatch(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+                offset = update.update_id + 1
+
+    async def _stop_forwarders(self):
+        for backlog in self.backlogs:
+            await backlog.put(None)
+        await asyncio.gather(*self.forwarders)
+
+    async def stop_workers(self):
+        loop = asyncio.get_running_loop()
+        deadline = time.time() + WORKER_STOP_TIMEOUT
+        # None после всех апдейтов — сигнал рабочему доделать их и завершиться
+        try:
+            await asyncio.wait_for(self._stop_forwarders(), WORKER_STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.warning("Не все апдейты переданы рабочим до остановки")
+        for index, process in enumerate(self.processes):
+            await loop.run_in_executor(None, process.join, max(0.0, deadline - time.time()))
+            if process.is_alive():
+                logging.warning(f"Рабочий {index} не остановился вовремя, завершаем")
+                process.kill()
+        for channel in self.channels:
+            channel.reader.close()
+
+    async def run(self):
+        for index in range(self.workers):
+            self.spawn(index)
+        self.forwarders = [asyncio.create_task(self._forward(index)) for index in range(self.workers)]
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass
+
+        tasks = [asyncio.create_task(self._poll()), asyncio.create_task(self._monitor())]
+        try:
+            await stop.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.stop_workers()
+
+
+async def main():
+    from aiogram import Bot
+
+    from dashboard import set_expert_commands
+    from db import DB_FILE, migrate_database
+    from experts import check_experts, parse_categories, parse_ids
+    from logging_setup import setup_logging
+    from ui import BOT_COMMANDS
+
+    setup_logging()
+    expert_ids = parse_ids(os.getenv("EXPERT_IDS") or os.getenv("EXPERT_ID"))
+    check_experts(expert_ids, parse_categories(os.getenv("EXPERT_CATEGORIES")))
+    if WORKERS > 1 and os.getenv("FSM_STORAGE", "sqlite:///fsm.db") == "memory":
+        raise SystemExit("Для нескольких рабочих нужно общее FSM_STORAGE (sqlite:///... или redis://...)")
+    if WORKERS > 1 and os.getenv("EXPERT_DISPATCH", "least_loaded") == "round_robin":
+        raise SystemExit("При нескольких рабочих EXPERT_DISPATCH=round_robin не делит заявки поровну, "
+                         "используйте least_loaded")
+
+    # Схема БД обновляется один раз, до запуска рабочих
+    migrate_database(DB_FILE)
+
+    bot = Bot(token=os.getenv("API_TOKEN"))
+    try:
+        await bot.set_my_commands(BOT_COMMANDS)
+        await set_expert_commands(bot, BOT_COMMANDS, expert_ids)
+        await bot.delete_webhook()
+        await Supervisor(bot).run()
+    finally:
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())